@@ -0,0 +1,67 @@
+"""
+Представление моделей в JSON API.
+
+Каждое поле описано функцией, поэтому при разреженной выборке
+(?fields=id,text) вычисляются только запрошенные поля.
+"""
+from posts.counters import stat
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+    'likes_count': lambda post: post.likes_count,
+    'comments_count': lambda post: post.comments_count,
+    'is_liked': lambda post: getattr(post, 'is_liked', False),
+    'is_following': lambda post: getattr(post, 'is_following', False),
+}
+
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created.isoformat(),
+    'likes_count': lambda comment: comment.like,
+    'is_liked': lambda comment: getattr(comment, 'is_liked', False),
+}
+
+GROUP_FIELDS = {
+    'id': lambda group: group.pk,
+    'slug': lambda group: group.slug,
+    'title': lambda group: group.title,
+    'description': lambda group: group.description,
+}
+
+PROFILE_FIELDS = {
+    'username': lambda user: user.username,
+    'full_name': lambda user: user.get_full_name(),
+    'posts_count': lambda user: stat(user, 'posts'),
+    'followers_count': lambda user: stat(user, 'followers'),
+    'following_count': lambda user: stat(user, 'following'),
+    'likes_received': lambda user: stat(user, 'likes_received'),
+    'is_following': lambda user: getattr(user, 'is_following', False),
+}
+
+
+class InvalidFields(Exception):
+    pass
+
+
+def parse_fields(params, available):
+    """Список полей из параметра fields; по умолчанию все поля."""
+    value = params.get('fields')
+    if not value:
+        return list(available)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise InvalidFields(unknown)
+    return fields
+
+
+def serialize(obj, available, fields):
+    return {name: available[name](obj) for name in fields}
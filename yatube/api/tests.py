@@ -0,0 +1,188 @@
+import json
+from http import HTTPStatus
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Group, Like, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number in range(15):
+            Post.objects.create(
+                text=f'Пост {number}', author=cls.author, group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def post_json(self, client, url, data):
+        return client.post(
+            url, json.dumps(data), content_type='application/json'
+        )
+
+    def test_posts_list_cursor(self):
+        """Лента постов отдаётся страницами по курсору."""
+        url = reverse('api:posts')
+        first = self.guest_client.get(url).json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertIsNotNone(first['next'])
+        second = self.guest_client.get(
+            url, {'after': first['next']}
+        ).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_sparse_fields(self):
+        """Параметр fields ограничивает набор полей."""
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,text', 'limit': 1}
+        )
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'text'})
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,secret'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_etag_not_modified(self):
+        """Повторный GET с тем же ETag получает 304."""
+        url = reverse('api:group_detail', args=[self.group.slug])
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_create_post_validation(self):
+        """Создание поста проверяется формой и требует авторизации."""
+        url = reverse('api:posts')
+        response = self.post_json(self.guest_client, url, {'text': 'Текст'})
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        response = self.post_json(self.authorized_client, url, {'text': ''})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('text', response.json()['errors'])
+        response = self.post_json(
+            self.authorized_client, url,
+            {'text': 'Новый пост', 'group': self.group.pk},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.json()['author'], 'reader')
+        self.assertEqual(
+            User.objects.get(pk=self.reader.pk).stats.posts, 1
+        )
+
+    def test_edit_post_author_only(self):
+        """Изменить пост через API может только автор."""
+        post = Post.objects.filter(author=self.author).first()
+        url = reverse('api:post_detail', args=[post.pk])
+        response = self.authorized_client.patch(
+            url, json.dumps({'text': 'Чужой'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        client = Client()
+        client.force_login(self.author)
+        response = client.patch(
+            url, json.dumps({'text': 'Исправлено'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['text'], 'Исправлено')
+        self.assertEqual(Post.objects.get(pk=post.pk).group, self.group)
+
+    def test_edit_post_with_form_data(self):
+        """PATCH принимает данные формы, прочие типы тела — 415."""
+        post = Post.objects.filter(author=self.author).first()
+        url = reverse('api:post_detail', args=[post.pk])
+        client = Client()
+        client.force_login(self.author)
+        response = client.patch(
+            url, urlencode({'text': 'Из формы'}),
+            content_type='application/x-www-form-urlencoded',
+        )
+        self.assertEqual(response.json()['text'], 'Из формы')
+        response = client.patch(
+            url, 'text=Из текста', content_type='text/plain'
+        )
+        self.assertEqual(
+            response.status_code, HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+        )
+        self.assertEqual(Post.objects.get(pk=post.pk).text, 'Из формы')
+
+    def test_head_allowed_with_get(self):
+        """Ресурсы с GET отвечают и на HEAD."""
+        response = self.guest_client.head(reverse('api:posts'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.content, b'')
+
+    def test_like_is_idempotent(self):
+        """POST и DELETE лайка не зависят от текущего состояния."""
+        post = Post.objects.first()
+        url = reverse('api:post_like', args=[post.pk])
+        for _ in range(2):
+            response = self.authorized_client.post(url)
+            self.assertEqual(
+                response.json(), {'liked': True, 'likes_count': 1}
+            )
+        response = self.authorized_client.delete(url)
+        self.assertEqual(response.json(), {'liked': False, 'likes_count': 0})
+        self.assertFalse(Like.objects.exists())
+
+    def test_likes_state_batch(self):
+        """Состояние лайков отдаётся пачкой по списку id."""
+        first, second = Post.objects.all()[:2]
+        Like.objects.create(user=self.reader, post=first)
+        response = self.authorized_client.get(
+            reverse('api:likes_state'), {'ids': f'{first.pk},{second.pk}'}
+        )
+        self.assertEqual(response.json()['liked'], {
+            str(first.pk): True, str(second.pk): False,
+        })
+        response = self.authorized_client.get(
+            reverse('api:likes_state'),
+            {'ids': ','.join(str(pk) for pk in range(1, 102))},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_follow_and_feed(self):
+        """Подписка через API сразу попадает в ленту."""
+        url = reverse('api:profile_follow', args=[self.author.username])
+        response = self.authorized_client.post(url)
+        self.assertEqual(
+            response.json(), {'following': True, 'followers_count': 1}
+        )
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists()
+        )
+        feed = self.authorized_client.get(reverse('api:follow_feed')).json()
+        self.assertEqual(len(feed['results']), 10)
+        self.assertTrue(feed['results'][0]['is_following'])
+        response = self.authorized_client.delete(url)
+        self.assertEqual(
+            response.json(), {'following': False, 'followers_count': 0}
+        )
+
+    def test_anonymous_private_endpoints(self):
+        """Личные данные недоступны гостю."""
+        for url in (reverse('api:follow_feed'), reverse('api:likes_state')):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.UNAUTHORIZED
+                )
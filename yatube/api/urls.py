@@ -0,0 +1,28 @@
+from django.urls import path
+from . import views
+
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.posts, name='posts'),
+    path('posts/batch/', views.posts_batch, name='posts_batch'),
+    path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
+    path('posts/<int:post_id>/like/', views.post_like, name='post_like'),
+    path('likes/state/', views.likes_state, name='likes_state'),
+    path('groups/', views.groups, name='groups'),
+    path('groups/<slug:slug>/', views.group_detail, name='group_detail'),
+    path('profiles/<str:username>/', views.profile, name='profile'),
+    path(
+        'profiles/<str:username>/follow/',
+        views.profile_follow,
+        name='profile_follow'
+    ),
+    path('follows/state/', views.follows_state, name='follows_state'),
+    path('feed/', views.follow_feed, name='follow_feed'),
+]
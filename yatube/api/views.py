@@ -0,0 +1,363 @@
+"""
+JSON API для мобильного клиента.
+
+Списки отдаются по курсору (after/before), поля выбираются параметром
+fields, а ответы на GET снабжаются ETag по содержимому. Данные проверяются
+формами приложения posts, записи идут через его сервисы счётчиков и ленты.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, QueryDict
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_http_methods
+
+from posts import counters, feed, viewer
+from posts.forms import CommentForm, PostForm
+from posts.models import Follow, Group, Like, Post, User
+from posts.paginators import CursorPaginator
+from posts.views import comments_page
+
+from .serializers import (COMMENT_FIELDS, GROUP_FIELDS, POST_FIELDS,
+                          PROFILE_FIELDS, InvalidFields, parse_fields,
+                          serialize)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MAX_PAGE_SIZE = 100
+MAX_BATCH_SIZE = 100
+SAFE_METHODS = ('GET', 'HEAD')
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+
+
+class BadRequest(Exception):
+    pass
+
+
+class Unauthorized(Exception):
+    pass
+
+
+class UnsupportedMediaType(Exception):
+    pass
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(
+        data, ensure_ascii=False, separators=(',', ':')
+    ).encode()
+
+
+def json_response(request, data, status=200):
+    response = HttpResponse(
+        dumps(data), content_type='application/json', status=status
+    )
+    if request.method in SAFE_METHODS and status == 200:
+        etag = '"%s"' % hashlib.md5(response.content).hexdigest()
+        response['ETag'] = etag
+        response = get_conditional_response(
+            request, etag=etag, response=response
+        )
+    return response
+
+
+def error_response(request, status, errors):
+    return json_response(request, {'errors': errors}, status=status)
+
+
+def allowed_methods(methods):
+    """Вместе с GET разрешается HEAD."""
+    if 'GET' in methods and 'HEAD' not in methods:
+        return list(methods) + ['HEAD']
+    return list(methods)
+
+
+def api_view(*methods):
+    """
+    Допустимые методы, ошибки в виде JSON и обязательная
+    авторизация для изменяющих запросов.
+    """
+    def decorator(view):
+        @require_http_methods(allowed_methods(methods))
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in SAFE_METHODS:
+                    require_user(request)
+                return view(request, *args, **kwargs)
+            except Unauthorized:
+                return error_response(
+                    request, 401, {'detail': ['Требуется авторизация.']}
+                )
+            except InvalidFields as error:
+                return error_response(request, 400, {
+                    'fields': ['Неизвестные поля: ' + ', '.join(error.args[0])]
+                })
+            except BadRequest as error:
+                return error_response(request, 400, {'detail': [str(error)]})
+            except UnsupportedMediaType:
+                return error_response(request, 415, {
+                    'detail': ['Ожидается JSON или данные формы.']
+                })
+            except Http404:
+                return error_response(
+                    request, 404, {'detail': ['Не найдено.']}
+                )
+        return wrapper
+    return decorator
+
+
+def require_user(request):
+    if not request.user.is_authenticated:
+        raise Unauthorized
+
+
+def request_data(request):
+    """
+    Тело запроса: JSON-объект или данные формы. Django разбирает формы
+    только в POST, поэтому тело PATCH и DELETE читается здесь;
+    multipart для них не поддерживается.
+    """
+    if request.content_type != 'application/json':
+        if request.method == 'POST':
+            return request.POST
+        if request.content_type == FORM_CONTENT_TYPE or not request.body:
+            return QueryDict(request.body, encoding=request.encoding)
+        raise UnsupportedMediaType
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise BadRequest('Некорректный JSON.')
+    if not isinstance(data, dict):
+        raise BadRequest('Ожидается JSON-объект.')
+    return data
+
+
+def page_size(params, default):
+    try:
+        size = int(params.get('limit', default))
+    except (TypeError, ValueError):
+        raise BadRequest('limit должен быть числом.')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def id_list(params, name):
+    try:
+        ids = [int(value) for value in params.get(name, '').split(',')
+               if value]
+    except ValueError:
+        raise BadRequest(f'{name} должен быть списком чисел.')
+    if len(ids) > MAX_BATCH_SIZE:
+        raise BadRequest(f'Не больше {MAX_BATCH_SIZE} значений за запрос.')
+    return ids
+
+
+def name_list(params, name):
+    names = [value for value in params.get(name, '').split(',') if value]
+    if len(names) > MAX_BATCH_SIZE:
+        raise BadRequest(f'Не больше {MAX_BATCH_SIZE} значений за запрос.')
+    return names
+
+
+def page_response(request, page_obj, available):
+    fields = parse_fields(request.GET, available)
+    return json_response(request, {
+        'results': [serialize(obj, available, fields) for obj in page_obj],
+        'next': page_obj.next_cursor,
+        'previous': page_obj.previous_cursor,
+    })
+
+
+def object_response(request, obj, available, status=200):
+    fields = parse_fields(request.GET, available)
+    return json_response(
+        request, serialize(obj, available, fields), status=status
+    )
+
+
+def post_queryset():
+    return Post.objects.select_related('author', 'group')
+
+
+def form_errors(request, form):
+    return error_response(request, 400, form.errors.get_json_data())
+
+
+@api_view('GET', 'POST')
+def posts(request):
+    if request.method == 'POST':
+        form = PostForm(request_data(request), files=request.FILES or None)
+        if not form.is_valid():
+            return form_errors(request, form)
+        post = form.save(commit=False)
+        post.author = request.user
+        with transaction.atomic():
+            post.save()
+        return object_response(request, post, POST_FIELDS, status=201)
+    post_list = post_queryset()
+    if request.GET.get('group'):
+        post_list = post_list.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        post_list = post_list.filter(author__username=request.GET['author'])
+    paginator = CursorPaginator(
+        post_list, page_size(request.GET, settings.POSTS_PER_PAGE)
+    )
+    page_obj = paginator.get_page(request.GET)
+    viewer.attach(request.user, page_obj)
+    return page_response(request, page_obj, POST_FIELDS)
+
+
+@api_view('GET')
+def posts_batch(request):
+    ids = id_list(request.GET, 'ids')
+    found = post_queryset().in_bulk(ids)
+    post_list = viewer.attach(
+        request.user, [found[pk] for pk in ids if pk in found]
+    )
+    fields = parse_fields(request.GET, POST_FIELDS)
+    return json_response(request, {
+        'results': [
+            serialize(post, POST_FIELDS, fields) for post in post_list
+        ],
+    })
+
+
+@api_view('GET', 'PATCH', 'DELETE')
+def post_detail(request, post_id):
+    post = get_object_or_404(post_queryset(), pk=post_id)
+    if request.method in SAFE_METHODS:
+        viewer.attach(request.user, [post])
+        return object_response(request, post, POST_FIELDS)
+    if post.author_id != request.user.pk:
+        return error_response(
+            request, 403, {'detail': ['Изменять пост может только автор.']}
+        )
+    if request.method == 'DELETE':
+        post.delete()
+        return HttpResponse(status=204)
+    data = {'text': post.text, 'group': post.group_id}
+    data.update(request_data(request).items())
+    form = PostForm(data, files=request.FILES or None, instance=post)
+    if not form.is_valid():
+        return form_errors(request, form)
+    form.save(commit=False).save(update_fields=PostForm.Meta.fields)
+    return object_response(request, post, POST_FIELDS)
+
+
+@api_view('GET', 'POST')
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk', 'author'), pk=post_id)
+    if request.method == 'POST':
+        form = CommentForm(request_data(request))
+        if not form.is_valid():
+            return form_errors(request, form)
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post = post
+        counters.add_comment(comment)
+        return object_response(request, comment, COMMENT_FIELDS, status=201)
+    return page_response(
+        request, comments_page(request, post, request.GET), COMMENT_FIELDS
+    )
+
+
+@api_view('POST', 'DELETE')
+def post_like(request, post_id):
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    liked = request.method == 'POST'
+    counters.set_post_like(request.user, post_id, liked)
+    likes_count = Post.objects.values_list('likes_count', flat=True).get(
+        pk=post_id
+    )
+    return json_response(
+        request, {'liked': liked, 'likes_count': likes_count}
+    )
+
+
+@api_view('GET')
+def likes_state(request):
+    require_user(request)
+    ids = id_list(request.GET, 'ids')
+    liked = set(Like.objects.filter(
+        user=request.user, post__in=ids
+    ).values_list('post_id', flat=True))
+    return json_response(
+        request, {'liked': {str(pk): pk in liked for pk in ids}}
+    )
+
+
+@api_view('GET')
+def groups(request):
+    paginator = CursorPaginator(
+        Group.objects.all(),
+        page_size(request.GET, settings.POSTS_PER_PAGE),
+        ordering=('title', 'id'),
+    )
+    return page_response(
+        request, paginator.get_page(request.GET), GROUP_FIELDS
+    )
+
+
+@api_view('GET')
+def group_detail(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return object_response(request, group, GROUP_FIELDS)
+
+
+@api_view('GET')
+def profile(request, username):
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    author.is_following = request.user.is_authenticated and (
+        Follow.objects.filter(user=request.user, author=author).exists()
+    )
+    return object_response(request, author, PROFILE_FIELDS)
+
+
+@api_view('POST', 'DELETE')
+def profile_follow(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.method == 'POST':
+        feed.follow(request.user.pk, author.pk)
+    else:
+        feed.unfollow(request.user.pk, author.pk)
+    author = User.objects.select_related('stats').get(pk=author.pk)
+    return json_response(request, {
+        'following': Follow.objects.filter(
+            user=request.user, author=author
+        ).exists(),
+        'followers_count': counters.stat(author, 'followers'),
+    })
+
+
+@api_view('GET')
+def follows_state(request):
+    require_user(request)
+    usernames = name_list(request.GET, 'usernames')
+    following = set(Follow.objects.filter(
+        user=request.user, author__username__in=usernames
+    ).values_list('author__username', flat=True))
+    return json_response(request, {
+        'following': {name: name in following for name in usernames}
+    })
+
+
+@api_view('GET')
+def follow_feed(request):
+    require_user(request)
+    paginator = feed.FeedPaginator(
+        request.user, page_size(request.GET, settings.POSTS_PER_PAGE)
+    )
+    page_obj = paginator.get_page(request.GET)
+    viewer.attach(request.user, page_obj)
+    return page_response(request, page_obj, POST_FIELDS)
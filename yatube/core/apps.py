@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+
+        from . import db
+
+        connection_created.connect(db.configure_sqlite)
+        request_started.connect(db.check_connections)
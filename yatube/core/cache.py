@@ -0,0 +1,280 @@
+"""
+Кэш в локальном файле SQLite, общий для всех процессов на одном хосте.
+
+Подключается как обычный бэкенд CACHES:
+
+    'BACKEND': 'core.cache.SQLiteCache',
+    'LOCATION': '/path/to/cache.sqlite3',
+    'OPTIONS': {'MAX_ENTRIES': 100000},
+
+Целые числа в пределах INTEGER SQLite хранятся как есть, поэтому incr
+выполняется одним атомарным UPDATE. Остальные значения, в том числе
+большие числа, сериализуются pickle. При превышении
+MAX_ENTRIES удаляются давно не читавшиеся записи (приближённый LRU).
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+INTEGER_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL,'
+    ' expires REAL, accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+NOT_EXPIRED = '(expires IS NULL OR expires > ?)'
+CHUNK_SIZE = 500
+
+
+def chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        # Время последнего чтения обновляется не чаще раза в TOUCH_INTERVAL
+        # секунд, чтобы чтения не превращались в запись.
+        self._touch_interval = options.get('TOUCH_INTERVAL', 60)
+        # Проверка размера выполняется в среднем раз в CULL_EVERY записей.
+        self._cull_every = options.get('CULL_EVERY', 100)
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _transaction(self, callback):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = callback(db)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return result
+
+    @staticmethod
+    def _dump(value):
+        if type(value) is int and (
+                INTEGER_RANGE[0] <= value <= INTEGER_RANGE[1]):
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _touch_stale(self, db, keys, now):
+        db.executemany(
+            'UPDATE cache SET accessed = ? WHERE key = ? AND accessed < ?',
+            [(now, key, now - self._touch_interval) for key in keys],
+        )
+
+    def _read(self, keys):
+        now = time.time()
+        found = {}
+        stale = []
+        db = self._db
+        for chunk in chunks(keys):
+            rows = db.execute(
+                'SELECT key, value, accessed FROM cache WHERE key IN (%s) '
+                'AND %s' % (', '.join('?' * len(chunk)), NOT_EXPIRED),
+                chunk + [now],
+            )
+            for key, value, accessed in rows:
+                found[key] = self._load(value)
+                if accessed < now - self._touch_interval:
+                    stale.append(key)
+        if stale:
+            self._touch_stale(db, stale, now)
+        return found
+
+    def get(self, key, default=None, version=None):
+        cache_key = self._key(key, version)
+        found = self._read([cache_key])
+        metrics.cache_lookup(key, cache_key in found)
+        return found.get(cache_key, default)
+
+    def get_many(self, keys, version=None):
+        mapping = {self._key(key, version): key for key in keys}
+        found = self._read(list(mapping))
+        for cache_key, key in mapping.items():
+            metrics.cache_lookup(key, cache_key in found)
+        return {mapping[key]: value for key, value in found.items()}
+
+    def _rows(self, data, timeout):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        return [
+            (key, self._dump(value), expires, now)
+            for key, value in data.items()
+        ]
+
+    def _write(self, data, timeout):
+        rows = self._rows(data, timeout)
+
+        def write(db):
+            db.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                rows,
+            )
+        self._transaction(write)
+        if random.randrange(self._cull_every) == 0:
+            self._cull()
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write({self._key(key, version): value}, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(
+            {self._key(key, version): value for key, value in data.items()},
+            timeout,
+        )
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        rows = self._rows({key: value}, timeout)
+
+        def add(db):
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND NOT %s' % NOT_EXPIRED,
+                (key, time.time()),
+            )
+            cursor = db.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                rows[0],
+            )
+            return cursor.rowcount == 1
+        return self._transaction(add)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+
+        def incr(db):
+            now = time.time()
+            cursor = db.execute(
+                'UPDATE cache SET value = value + ? WHERE key = ? '
+                "AND typeof(value) = 'integer' "
+                'AND value + ? BETWEEN ? AND ? AND %s' % NOT_EXPIRED,
+                (delta, key, delta, *INTEGER_RANGE, now),
+            )
+            if cursor.rowcount == 1:
+                return db.execute(
+                    'SELECT value FROM cache WHERE key = ?', (key,)
+                ).fetchone()[0]
+            # Результат вне INTEGER или значение уже сериализовано.
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? AND %s' % NOT_EXPIRED,
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = self._load(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self._dump(value), key),
+            )
+            return value
+        return self._transaction(incr)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND %s' % NOT_EXPIRED,
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+
+        def delete(db):
+            for chunk in chunks(keys):
+                db.execute(
+                    'DELETE FROM cache WHERE key IN (%s)'
+                    % ', '.join('?' * len(chunk)),
+                    chunk,
+                )
+        self._transaction(delete)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? AND %s' % NOT_EXPIRED,
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _cull(self):
+        def cull(db):
+            db.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+            )
+            count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count <= self._max_entries:
+                return
+            excess = count - self._max_entries
+            if self._cull_frequency:
+                excess = max(excess, count // self._cull_frequency)
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (excess,),
+            )
+        self._transaction(cull)
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами потока.
+        pass
@@ -0,0 +1,47 @@
+"""
+Настройка соединений SQLite.
+
+Каждое новое соединение получает PRAGMA из SQLITE_PRAGMAS: WAL, чтобы
+писатель не блокировал читателей, busy_timeout вместо мгновенного
+«database is locked», mmap и кэш страниц. При CONN_MAX_AGE соединение
+живёт между запросами, поэтому в начале запроса оно проверяется
+и при ошибке закрывается — Django откроет новое.
+"""
+import sqlite3
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Приёмник сигнала connection_created."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_usable(connection):
+    if connection.vendor != 'sqlite':
+        return connection.is_usable()
+    # Бэкенд SQLite в Django всегда считает соединение рабочим.
+    try:
+        connection.connection.execute('SELECT 1')
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def check_connections(**kwargs):
+    """Приёмник request_started: закрывает сломанные соединения."""
+    if not settings.DB_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if not is_usable(connection):
+            try:
+                connection.close()
+            except DatabaseError:
+                connection.connection = None
@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+PARAMS = {'OPTIONS': {'MAX_ENTRIES': 10 ** 6}}
+BACKENDS = {
+    'locmem': lambda path: LocMemCache('bench', PARAMS),
+    'file': lambda path: FileBasedCache(os.path.join(path, 'file'), PARAMS),
+    'sqlite': lambda path: SQLiteCache(
+        os.path.join(path, 'cache.sqlite3'), PARAMS
+    ),
+}
+
+
+def run_worker(args):
+    """Смешанная нагрузка: чтение пачками, запись и incr общих ключей."""
+    name, path, operations, keys, seed = args
+    cache = BACKENDS[name](path)
+    rnd = random.Random(seed)
+    hits = misses = 0
+    started = time.perf_counter()
+    for i in range(operations):
+        batch = ['key:%d' % rnd.randrange(keys) for _ in range(10)]
+        found = cache.get_many(batch)
+        hits += len(found)
+        misses += len(batch) - len(found)
+        for key in batch:
+            if key not in found:
+                cache.set(key, 'x' * 512)
+        if i % 10 == 0:
+            cache.add('counter', 0, None)
+            try:
+                cache.incr('counter')
+            except ValueError:
+                pass
+    return time.perf_counter() - started, hits, misses, cache.get('counter')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает бэкенды кэша (LocMem, файловый, SQLite) '
+            'под нагрузкой из нескольких процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--operations', type=int, default=2000)
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument(
+            '--backend', action='append', choices=sorted(BACKENDS),
+            help='Бэкенд для проверки; по умолчанию все.'
+        )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        for name in options['backend'] or sorted(BACKENDS):
+            with tempfile.TemporaryDirectory() as path:
+                jobs = [
+                    (name, path, options['operations'], options['keys'], seed)
+                    for seed in range(processes)
+                ]
+                started = time.perf_counter()
+                with multiprocessing.Pool(processes) as pool:
+                    results = pool.map(run_worker, jobs)
+                elapsed = time.perf_counter() - started
+            hits = sum(result[1] for result in results)
+            misses = sum(result[2] for result in results)
+            total_ops = processes * options['operations']
+            expected = processes * len(range(0, options['operations'], 10))
+            counter = max(result[3] or 0 for result in results)
+            self.stdout.write(
+                f'{name:>7}: {total_ops / elapsed:10.0f} итераций/с, '
+                f'попаданий {hits / (hits + misses):.1%}, '
+                f'incr {counter} из {expected}'
+            )
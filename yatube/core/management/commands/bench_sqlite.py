@@ -0,0 +1,178 @@
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from .bench_views import percentile
+
+READ_SQL = (
+    'SELECT post.id, post.text, author.username FROM posts_post AS post '
+    'JOIN auth_user AS author ON author.id = post.author_id '
+    'ORDER BY post.pub_date DESC LIMIT 10 OFFSET ?'
+)
+
+LOCKED = ('database is locked', 'database table is locked')
+
+
+def modes():
+    """
+    before — как было: журнал отката и новое соединение на каждый
+    запрос; after — PRAGMA из настроек и постоянное соединение.
+    """
+    return {
+        'before': ({'journal_mode': 'DELETE'}, False),
+        'after': (settings.SQLITE_PRAGMAS, True),
+    }
+
+
+def connect(path, pragmas):
+    db = sqlite3.connect(path, isolation_level=None)
+    for name, value in pragmas.items():
+        db.execute(f'PRAGMA {name} = {value}')
+    return db
+
+
+def read(db, rnd, users, posts):
+    db.execute(READ_SQL, (rnd.randrange(len(posts)),)).fetchall()
+
+
+def write(db, rnd, users, posts):
+    """Переключает лайк, как counters.set_post_like."""
+    user, post = rnd.choice(users), rnd.choice(posts)
+    db.execute('BEGIN')
+    try:
+        deleted = db.execute(
+            'DELETE FROM posts_like WHERE user_id = ? AND post_id = ?',
+            (user, post),
+        ).rowcount
+        if not deleted:
+            db.execute(
+                'INSERT INTO posts_like (user_id, post_id) VALUES (?, ?)',
+                (user, post),
+            )
+        db.execute(
+            'UPDATE posts_post SET likes_count = likes_count + ? '
+            'WHERE id = ?', (-1 if deleted else 1, post),
+        )
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    db.execute('COMMIT')
+
+
+def worker(task):
+    """Процесс нагрузки: (операций, ошибок блокировки, задержки в мс)."""
+    path, pragmas, persistent, operation, seconds, seed, users, posts = task
+    action = read if operation == 'read' else write
+    rnd = random.Random(seed)
+    done, locked, latencies = 0, 0, []
+    db = connect(path, pragmas) if persistent else None
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        current = db or connect(path, pragmas)
+        try:
+            action(current, rnd, users, posts)
+            done += 1
+        except sqlite3.OperationalError as error:
+            if str(error) not in LOCKED:
+                raise
+            locked += 1
+        finally:
+            if current is not db:
+                current.close()
+        latencies.append((time.perf_counter() - started) * 1000)
+    if db is not None:
+        db.close()
+    return done, locked, latencies
+
+
+class Command(BaseCommand):
+    help = ('Замеряет пропускную способность SQLite при одновременных '
+            'чтениях ленты и лайках до и после настройки соединений. '
+            'Работает на копии базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность замера каждого режима.'
+        )
+
+    def snapshot(self, directory, name, journal_mode):
+        path = os.path.join(directory, f'{name}.sqlite3')
+        target = sqlite3.connect(path)
+        connection.ensure_connection()
+        connection.connection.backup(target)
+        target.execute(f'PRAGMA journal_mode = {journal_mode}')
+        users = [row[0] for row in target.execute(
+            'SELECT id FROM auth_user ORDER BY random() LIMIT 1000'
+        )]
+        posts = [row[0] for row in target.execute(
+            'SELECT id FROM posts_post ORDER BY random() LIMIT 1000'
+        )]
+        target.close()
+        if not users or not posts:
+            raise CommandError('Нет данных; сначала выполните seed_bench.')
+        return path, users, posts
+
+    def run(self, path, pragmas, persistent, users, posts, options):
+        operations = (
+            ['read'] * options['readers'] + ['write'] * options['writers']
+        )
+        tasks = [
+            (path, pragmas, persistent, operation, options['seconds'],
+             number, users, posts)
+            for number, operation in enumerate(operations)
+        ]
+        with multiprocessing.Pool(len(tasks)) as pool:
+            results = pool.map(worker, tasks)
+        report = {}
+        for operation in ('read', 'write'):
+            mine = [
+                result for task, result in zip(tasks, results)
+                if task[3] == operation
+            ]
+            latencies = [value for _, _, values in mine for value in values]
+            report[operation] = {
+                'per_second': sum(done for done, _, _ in mine)
+                / options['seconds'],
+                'locked': sum(locked for _, locked, _ in mine),
+                'p95_ms': percentile(latencies, 0.95) if latencies else 0,
+            }
+        return report
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда рассчитана на SQLite.')
+        if connection.in_atomic_block:
+            # Копия базы через backup() внутри транзакции не завершится.
+            raise CommandError('Команда не работает внутри транзакции.')
+        directory = tempfile.mkdtemp()
+        try:
+            for name, (pragmas, persistent) in modes().items():
+                path, users, posts = self.snapshot(
+                    directory, name, pragmas.get('journal_mode', 'DELETE')
+                )
+                report = self.run(
+                    path, pragmas, persistent, users, posts, options
+                )
+                for operation, label in (('read', 'чтения'),
+                                         ('write', 'записи')):
+                    result = report[operation]
+                    self.stdout.write(
+                        f'{name:<6} {label:<6} '
+                        f'{result["per_second"]:9.1f} оп/с  '
+                        f'p95 {result["p95_ms"]:8.2f} мс  '
+                        f'блокировок {result["locked"]}'
+                    )
+        finally:
+            shutil.rmtree(directory)
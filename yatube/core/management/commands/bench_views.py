@@ -0,0 +1,171 @@
+import json
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import URLPattern, get_resolver, reverse
+
+from posts.models import Comment, Group, Post, User
+
+NAMESPACES = ('posts', 'users', 'about')
+
+SKIP = {
+    'posts:post_delete',
+    'posts:delete_comment',
+    'users:logout',
+    'users:password_reset_confirm',
+}
+
+
+class QueryTimer:
+    """Обёртка execute_wrapper: число запросов и их суммарное время."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def percentile(values, fraction):
+    """Значение по методу ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[round(fraction * (len(ordered) - 1))]
+
+
+def url_names():
+    """Имена всех маршрутов NAMESPACES вида namespace:name."""
+    resolver = get_resolver()
+    for namespace in NAMESPACES:
+        _, sub_resolver = resolver.namespace_dict[namespace]
+        for pattern in sub_resolver.url_patterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                yield f'{namespace}:{pattern.name}', pattern
+
+
+def sample_kwargs():
+    """
+    Значения аргументов маршрутов: самый популярный автор, его свежий
+    пост с комментарием, самая наполненная группа.
+    """
+    author = User.objects.annotate(
+        total=Count('following')
+    ).order_by('-total', 'pk').first()
+    reader = User.objects.annotate(
+        total=Count('follower')
+    ).order_by('-total', 'pk').first()
+    comment = Comment.objects.order_by('-post__likes_count', 'pk').first()
+    post = comment.post if comment else Post.objects.first()
+    group = Group.objects.annotate(
+        total=Count('posts')
+    ).order_by('-total', 'pk').first()
+    if None in (author, reader, post, group):
+        raise CommandError('Нет данных; сначала выполните seed_bench.')
+    return reader, {
+        'username': author.username,
+        'post_id': post.pk,
+        'com_id': comment.pk if comment else None,
+        'slug': group.slug,
+        'kind': 'posts',
+    }
+
+
+class Command(BaseCommand):
+    help = ('Замеряет все страницы posts, users и about через тестовый '
+            'клиент: p50/p95 времени ответа, число запросов и время SQL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Количество замеров каждой страницы.'
+        )
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Запросы без авторизации.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument('--output', help='Сохранить результаты в JSON.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого запуска для сравнения p50.'
+        )
+
+    def measure(self, client, url, repeat, cold):
+        client.get(url)
+        latencies, sql_times, queries = [], [], 0
+        for _ in range(repeat):
+            if cold:
+                cache.clear()
+            timer = QueryTimer()
+            with connection.execute_wrapper(timer):
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries = timer.count
+            sql_times.append(timer.seconds * 1000)
+        return {
+            'url': url,
+            'status': response.status_code,
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'queries': queries,
+            'sql_ms': round(percentile(sql_times, 0.5), 2),
+        }
+
+    def report(self, name, result, previous):
+        line = (
+            f'{name:<32} {result["status"]:>3} '
+            f'p50 {result["p50_ms"]:8.2f} мс  p95 {result["p95_ms"]:8.2f} мс  '
+            f'запросов {result["queries"]:>3}  SQL {result["sql_ms"]:7.2f} мс'
+        )
+        if name in previous and previous[name]['p50_ms']:
+            change = result['p50_ms'] / previous[name]['p50_ms'] - 1
+            line += f'  {change:+.0%}'
+        self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        previous = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)['results']
+        reader, samples = sample_kwargs()
+        client = Client(HTTP_REFERER='/')
+        if not options['anonymous']:
+            client.force_login(reader)
+        results = {}
+        for name, pattern in url_names():
+            arguments = pattern.pattern.converters
+            if name in SKIP or any(
+                samples.get(argument) is None for argument in arguments
+            ):
+                continue
+            url = reverse(name, kwargs={
+                argument: samples[argument] for argument in arguments
+            })
+            results[name] = self.measure(
+                client, url, options['repeat'], options['cold']
+            )
+            self.report(name, results[name], previous)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'repeat': options['repeat'],
+                    'anonymous': options['anonymous'],
+                    'cold': options['cold'],
+                    'rows': {
+                        'users': User.objects.count(),
+                        'posts': Post.objects.count(),
+                    },
+                    'results': results,
+                }, file, ensure_ascii=False, indent=2)
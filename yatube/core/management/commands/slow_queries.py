@@ -0,0 +1,90 @@
+import json
+import os
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from .bench_views import percentile
+
+
+def log_files(path, backups):
+    """Журнал и его ротированные копии, от старых к новым."""
+    names = [f'{path}.{number}' for number in range(backups, 0, -1)]
+    return [name for name in names + [path] if os.path.exists(name)]
+
+
+def read_entries(paths, since=None, view=None):
+    for path in paths:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if since and entry['time'] < since:
+                    continue
+                if view and entry['view'] != view:
+                    continue
+                yield entry
+
+
+def summarize(entries):
+    """Сводка по формам запросов, самые затратные — первыми."""
+    shapes = defaultdict(list)
+    for entry in entries:
+        shapes[entry['sql']].append(entry)
+    summary = []
+    for sql, group in shapes.items():
+        durations = [entry['duration_ms'] for entry in group]
+        plans = [entry['plan'] for entry in group if entry.get('plan')]
+        summary.append({
+            'sql': sql,
+            'count': len(group),
+            'total_ms': round(sum(durations), 2),
+            'p95_ms': percentile(durations, 0.95),
+            'max_ms': max(durations),
+            'sites': Counter(entry['site'] for entry in group),
+            'views': Counter(entry['view'] for entry in group),
+            'plan': plans[-1] if plans else None,
+        })
+    summary.sort(key=lambda item: item['total_ms'], reverse=True)
+    return summary
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов: формы запросов по '
+            'суммарному времени, p95, маршруты, места вызова и план.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Количество форм запросов в сводке.'
+        )
+        parser.add_argument(
+            '--since', help='Учитывать записи не раньше (ISO 8601, UTC).'
+        )
+        parser.add_argument('--view', help='Только один маршрут.')
+
+    def handle(self, *args, **options):
+        paths = log_files(
+            settings.SLOW_QUERY_LOG, settings.SLOW_QUERY_LOG_BACKUPS
+        )
+        summary = summarize(
+            read_entries(paths, options['since'], options['view'])
+        )
+        if not summary:
+            self.stdout.write('Медленных запросов нет.')
+            return
+        for item in summary[:options['top']]:
+            self.stdout.write(
+                f'{item["total_ms"]:10.2f} мс  {item["count"]:>5} раз  '
+                f'p95 {item["p95_ms"]:.2f} мс  макс {item["max_ms"]:.2f} мс'
+            )
+            self.stdout.write(f'  {item["sql"]}')
+            for label, counter in (('маршрут', item['views']),
+                                   ('место', item['sites'])):
+                for name, count in counter.most_common(3):
+                    self.stdout.write(f'  {label}: {name} ({count})')
+            for line in item['plan'] or ():
+                self.stdout.write(f'  план: {line}')
@@ -0,0 +1,327 @@
+"""
+Метрики в формате Prometheus.
+
+Каждый процесс копит счётчики и гистограммы в памяти (одна короткая
+блокировка на обновление) и не чаще раза в METRICS_FLUSH_INTERVAL секунд
+сбрасывает их в свой файл METRICS_DIR/<pid>-<метка>.json. Метка уникальна
+для запуска процесса, поэтому повторно выданный pid не затирает чужой
+файл. Страница /metrics складывает файлы всех процессов; файлы завершённых
+процессов переносятся в archive.json, и суммы счётчиков не уменьшаются.
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connection
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template as DjangoTemplate
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Обработанные запросы по маршруту и коду ответа.'
+    ),
+    'yatube_request_seconds': (
+        'histogram', 'Время ответа по маршруту.'
+    ),
+    'yatube_sql_queries_total': (
+        'counter', 'SQL-запросы по маршруту.'
+    ),
+    'yatube_sql_seconds_total': (
+        'counter', 'Время SQL-запросов по маршруту.'
+    ),
+    'yatube_template_seconds': (
+        'histogram', 'Время рендеринга шаблонов.'
+    ),
+    'yatube_cache_requests_total': (
+        'counter', 'Обращения к кэшу по префиксу ключа и результату.'
+    ),
+    'yatube_image_render_seconds': (
+        'histogram', 'Время создания вариантов картинки.'
+    ),
+}
+
+ARCHIVE = 'archive.json'
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_flushed = 0.0
+_process = None
+_directory = None
+
+
+def process_name():
+    """
+    Имя файла процесса. После fork дочерний процесс получает новое имя
+    и начинает с пустых метрик, не повторяя значения родителя.
+    """
+    global _process
+    if _process is None or _process[0] != os.getpid():
+        with _lock:
+            _counters.clear()
+            _histograms.clear()
+        _process = (os.getpid(), f'{os.getpid()}-{uuid.uuid4().hex[:8]}')
+    return _process[1] + '.json'
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    process_name()
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    process_name()
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for position, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[position] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+def cache_lookup(key, hit):
+    """Префикс — часть ключа до первого двоеточия."""
+    inc(
+        'yatube_cache_requests_total',
+        prefix=str(key).split(':', 1)[0],
+        result='hit' if hit else 'miss',
+    )
+
+
+def snapshot():
+    with _lock:
+        return as_data(_counters, {
+            key: list(values) for key, values in _histograms.items()
+        })
+
+
+def write(path, data):
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(data, file)
+    os.replace(path + '.tmp', path)
+
+
+def flush(force=False, directory=None):
+    """Записывает метрики процесса в его файл."""
+    global _flushed, _directory
+    now = time.monotonic()
+    if not force and now - _flushed < settings.METRICS_FLUSH_INTERVAL:
+        return
+    _flushed = now
+    _directory = directory or settings.METRICS_DIR
+    os.makedirs(_directory, exist_ok=True)
+    name = process_name()
+    write(os.path.join(_directory, name), snapshot())
+
+
+@atexit.register
+def flush_at_exit():
+    """Последний сброс в каталог, куда процесс уже писал."""
+    if _directory and os.path.isdir(_directory):
+        flush(force=True, directory=_directory)
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def merge(data, counters, histograms):
+    for name, labels, value in data['counters']:
+        key = _key(name, labels)
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, values in data['histograms']:
+        key = _key(name, labels)
+        total = histograms.setdefault(key, [0] * len(values))
+        for position, value in enumerate(values):
+            total[position] += value
+
+
+def as_data(counters, histograms):
+    return {
+        'counters': [
+            [name, dict(labels), value]
+            for (name, labels), value in counters.items()
+        ],
+        'histograms': [
+            [name, dict(labels), values]
+            for (name, labels), values in histograms.items()
+        ],
+    }
+
+
+def archive_finished(directory):
+    """
+    Переносит файлы завершённых процессов в archive.json. Файл сначала
+    переименовывается, поэтому параллельный сбор не учтёт его дважды.
+    """
+    for filename in os.listdir(directory):
+        pid = filename.split('-', 1)[0].split('.', 1)[0]
+        if (not filename.endswith('.json') or not pid.isdigit()
+                or is_running(int(pid))):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            os.rename(path, path[:-len('.json')] + '.finished')
+        except FileNotFoundError:
+            continue
+    finished = [
+        name for name in os.listdir(directory) if name.endswith('.finished')
+    ]
+    if not finished:
+        return
+    with open(os.path.join(directory, 'archive.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        counters, histograms = {}, {}
+        archive = read(os.path.join(directory, ARCHIVE))
+        if archive:
+            merge(archive, counters, histograms)
+        merged = []
+        for name in finished:
+            data = read(os.path.join(directory, name))
+            if data is not None:
+                merge(data, counters, histograms)
+                merged.append(name)
+        write(
+            os.path.join(directory, ARCHIVE), as_data(counters, histograms)
+        )
+        for name in merged:
+            os.remove(os.path.join(directory, name))
+
+
+def collect():
+    """Сумма метрик всех процессов: (счётчики, гистограммы)."""
+    flush(force=True)
+    archive_finished(settings.METRICS_DIR)
+    counters, histograms = {}, {}
+    for filename in os.listdir(settings.METRICS_DIR):
+        if filename.endswith('.json'):
+            data = read(os.path.join(settings.METRICS_DIR, filename))
+            if data is not None:
+                merge(data, counters, histograms)
+    return counters, histograms
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"')
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, escape(value)) for name, value in pairs
+    )
+
+
+def exposition():
+    """Текст в формате Prometheus 0.0.4."""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(BUCKETS, values):
+                lines.append(
+                    f'{name}_bucket{format_labels(labels, le=bound)} {count}'
+                )
+            lines += [
+                f'{name}_bucket{format_labels(labels, le="+Inf")} '
+                f'{values[-1]}',
+                f'{name}_sum{format_labels(labels)} {values[-2]}',
+                f'{name}_count{format_labels(labels)} {values[-1]}',
+            ]
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Время ответа, число и время SQL-запросов по маршруту."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sql = {'count': 0, 'seconds': 0.0}
+
+        def count_sql(execute, *args):
+            started = time.perf_counter()
+            try:
+                return execute(*args)
+            finally:
+                sql['seconds'] += time.perf_counter() - started
+                sql['count'] += 1
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_sql):
+            response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        observe(
+            'yatube_request_seconds', time.perf_counter() - started, view=view
+        )
+        inc('yatube_requests_total', view=view, status=response.status_code)
+        inc('yatube_sql_queries_total', sql['count'], view=view)
+        inc('yatube_sql_seconds_total', sql['seconds'], view=view)
+        flush()
+        return response
+
+
+class TimedTemplate(DjangoTemplate):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            observe(
+                'yatube_template_seconds',
+                time.perf_counter() - started,
+                template=self.origin.template_name or 'string',
+            )
+
+
+class TimedTemplates(DjangoTemplates):
+    """Шаблонизатор Django, замеряющий время render() шаблонов."""
+
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return TimedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
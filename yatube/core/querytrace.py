@@ -0,0 +1,151 @@
+"""
+Трассировка SQL-запросов одного HTTP-запроса.
+
+Запросы группируются по форме: числа и списки IN сворачиваются, поэтому
+«SELECT ... WHERE id = 1» и «... id = 2» считаются одной формой. Форма,
+повторённая QUERY_TRACE_REPEAT раз за запрос, — признак N+1; для неё
+запоминается шаблон и строка (или строка кода), откуда пришёл запрос.
+Число запросов сверяется с бюджетом QUERY_BUDGETS по имени маршрута.
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('yatube.queries')
+
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+NUMBER = re.compile(r'\b\d+\b')
+STRING = re.compile(r"'(?:[^']|'')*'")
+SPACES = re.compile(r'\s+')
+
+# Обёртки execute_wrapper из этих модулей стоят в стеке между кодом
+# проекта и драйвером, поэтому местом вызова не считаются.
+INSTRUMENTATION = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('querytrace.py', 'metrics.py', 'slowlog.py')
+}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def normalize(sql):
+    """Форма запроса без конкретных значений."""
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = IN_LIST.sub('(%s, ...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def origin():
+    """
+    Место, откуда выполнен запрос: ближайший узел шаблона
+    («шаблон:строка»), иначе ближайшая строка кода проекта.
+    """
+    frame = sys._getframe(2)
+    code_line = None
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            if token is not None and node.origin is not None:
+                return f'{node.origin.template_name}:{token.lineno}'
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (code_line is None and filename not in INSTRUMENTATION
+                and filename.startswith(settings.BASE_DIR)):
+            code_line = '%s:%d' % (
+                os.path.relpath(filename, settings.BASE_DIR), frame.f_lineno
+            )
+        frame = frame.f_back
+    return code_line or '?'
+
+
+class QueryTrace:
+    """Обёртка для connection.execute_wrapper, копящая запросы."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (normalize(sql), origin(), time.perf_counter() - started)
+            )
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def seconds(self):
+        return sum(seconds for _, _, seconds in self.queries)
+
+    def repeated(self, threshold):
+        """
+        Формы, выполненные не меньше threshold раз:
+        список (форма, число, места вызова).
+        """
+        origins = defaultdict(list)
+        for shape, place, _ in self.queries:
+            origins[shape].append(place)
+        return [
+            (shape, len(places), sorted(set(places)))
+            for shape, places in origins.items()
+            if len(places) >= threshold
+        ]
+
+    def problems(self, view_name):
+        """Описания нарушений: N+1 и превышение бюджета."""
+        problems = [
+            f'N+1: {count} раз {shape} ({", ".join(places)})'
+            for shape, count, places in self.repeated(
+                settings.QUERY_TRACE_REPEAT
+            )
+        ]
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        if budget is not None and len(self) > budget:
+            problems.append(
+                f'{view_name}: {len(self)} запросов при бюджете {budget}'
+            )
+        return problems
+
+
+@contextmanager
+def trace(using=connection):
+    queries = QueryTrace()
+    with using.execute_wrapper(queries):
+        yield queries
+
+
+class QueryTraceMiddleware:
+    """
+    Включается настройкой QUERY_TRACE. Нарушения пишутся в лог
+    yatube.queries, а при QUERY_TRACE_RAISE — приводят к исключению,
+    которое тестовый клиент пробрасывает в тест.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_TRACE:
+            return self.get_response(request)
+        with trace() as queries:
+            response = self.get_response(request)
+        match = request.resolver_match
+        problems = queries.problems(match.view_name if match else None)
+        if problems and settings.QUERY_TRACE_RAISE:
+            raise QueryBudgetExceeded('\n'.join(problems))
+        for problem in problems:
+            logger.warning('%s %s', request.path, problem)
+        return response
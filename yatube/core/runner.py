@@ -0,0 +1,38 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Запускает тесты с файлами кэша, метрик и журнала медленных запросов
+    во временном каталоге: тесты не пишут в дерево проекта и не очищают
+    общий кэш.
+    """
+
+    def test_settings(self, directory):
+        return {
+            'CACHES': {
+                alias: dict(config, LOCATION=f'{directory}/{alias}.sqlite3')
+                if config['BACKEND'] == 'core.cache.SQLiteCache' else config
+                for alias, config in settings.CACHES.items()
+            },
+            'METRICS_DIR': f'{directory}/metrics',
+            'SLOW_QUERY_LOG': f'{directory}/logs/slow_queries.log',
+        }
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.directory = tempfile.mkdtemp()
+        self.overrides = override_settings(
+            **self.test_settings(self.directory)
+        )
+        self.overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.overrides.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,148 @@
+"""
+Журнал медленных SQL-запросов.
+
+Запрос дольше SLOW_QUERY_MS записывается строкой JSON в SLOW_QUERY_LOG:
+форма запроса, параметры (при SLOW_QUERY_REDACT — только их число),
+длительность, маршрут и место вызова — строка шаблона или кода. Файл
+общий для всех процессов и ротируется по размеру под блокировкой.
+Для SELECT дольше SLOW_QUERY_EXPLAIN_MS к записи прикладывается план
+запроса. Сводку строит команда slow_queries.
+"""
+import fcntl
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connection
+
+from .querytrace import normalize, origin
+
+_handlers = {}
+
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler для файла, в который пишут несколько процессов.
+    Запись и ротация идут под fcntl.flock на <журнал>.lock; если файл
+    уже переименовал другой процесс, он открывается заново.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.lock_file = open(self.baseFilename + '.lock', 'a')
+
+    def reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is None or (current.st_dev, current.st_ino) != (
+                opened.st_dev, opened.st_ino):
+            self.stream.close()
+            self.stream = None
+
+    def emit(self, record):
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            self.reopen_if_rotated()
+            super().emit(record)
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        super().close()
+        self.lock_file.close()
+
+
+def handler():
+    path = settings.SLOW_QUERY_LOG
+    if path not in _handlers:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _handlers[path] = SharedRotatingFileHandler(
+            path,
+            maxBytes=settings.SLOW_QUERY_LOG_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+            encoding='utf-8',
+        )
+    return _handlers[path]
+
+
+def write(entry):
+    message = json.dumps(entry, ensure_ascii=False, default=str)
+    handler().handle(logging.makeLogRecord({'msg': message}))
+
+
+def explain(using, sql, params):
+    """
+    План запроса или None, если его не получить. EXPLAIN идёт курсором
+    драйвера в обход execute_wrapper: он не должен попасть в бюджеты
+    запросов, метрики SQL и сам журнал.
+    """
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    try:
+        with using.cursor() as wrapper:
+            cursor = wrapper.cursor
+            cursor.execute(
+                using.ops.explain_query_prefix() + ' ' + sql, params
+            )
+            return [str(row[-1]) for row in cursor.fetchall()]
+    except Exception:
+        return None
+
+
+def logged_params(params, many):
+    if many:
+        return f'{len(params)} наборов'
+    if settings.SLOW_QUERY_REDACT and params:
+        return f'{len(params)} параметров'
+    return params
+
+
+def entry(sql, params, many, seconds, view, site, using):
+    record = {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'duration_ms': round(seconds * 1000, 2),
+        'sql': normalize(sql),
+        'params': logged_params(params, many),
+        'view': view,
+        'site': site,
+    }
+    if not many and seconds * 1000 >= settings.SLOW_QUERY_EXPLAIN_MS:
+        record['plan'] = explain(using, sql, params)
+    return record
+
+
+class SlowQueryMiddleware:
+    """Включается порогом SLOW_QUERY_MS; None выключает журнал."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.SLOW_QUERY_MS is None:
+            return self.get_response(request)
+
+        def log_slow(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                seconds = time.perf_counter() - started
+                if seconds * 1000 >= settings.SLOW_QUERY_MS:
+                    match = request.resolver_match
+                    write(entry(
+                        sql, params, many, seconds,
+                        match.view_name if match else None,
+                        origin(), context['connection'],
+                    ))
+
+        with connection.execute_wrapper(log_slow):
+            return self.get_response(request)
@@ -1,5 +1,21 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
 from http import HTTPStatus
-from django.test import TestCase
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from posts.models import Post
+from . import db, metrics, slowlog
+from .cache import SQLiteCache
+from .querytrace import normalize, trace
 
 
 class ErrorURLTest(TestCase):
@@ -12,3 +28,283 @@ class ErrorURLTest(TestCase):
         """Страница ошибки 404 использует соответствующий шаблон."""
         response = self.client.get('/unexisting_page/')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SQLiteCache(
+            os.path.join(self.directory, 'cache.sqlite3'),
+            {'OPTIONS': {'MAX_ENTRIES': 5, 'CULL_EVERY': 1}}
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_get_set_many(self):
+        """Значения любых типов сохраняются и читаются пачкой."""
+        self.cache.set_many({'a': 1, 'b': {'text': 'Текст'}})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']),
+            {'a': 1, 'b': {'text': 'Текст'}}
+        )
+
+    def test_incr_and_add(self):
+        """add не перезаписывает значение, incr атомарно увеличивает его."""
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 10))
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_big_integers(self):
+        """Числа вне диапазона INTEGER сохраняются и увеличиваются."""
+        self.cache.set('big', 2 ** 70)
+        self.assertEqual(self.cache.get('big'), 2 ** 70)
+        self.cache.set('edge', 2 ** 63 - 1)
+        self.assertEqual(self.cache.incr('edge'), 2 ** 63)
+        self.assertEqual(self.cache.get('edge'), 2 ** 63)
+        self.assertEqual(self.cache.incr('big', -1), 2 ** 70 - 1)
+
+    def test_expired_values(self):
+        """Просроченные значения не возвращаются."""
+        self.cache.set('key', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+
+    def test_shared_between_instances(self):
+        """Разные экземпляры с одним файлом видят общие данные."""
+        other = SQLiteCache(self.cache._path, {})
+        self.cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        other.delete('key')
+        self.assertFalse(self.cache.has_key('key'))
+
+    def test_cull_keeps_size_limit(self):
+        """Количество записей ограничено MAX_ENTRIES."""
+        for i in range(20):
+            self.cache.set(f'key{i}', i)
+        count = self.cache._db.execute('SELECT COUNT(*) FROM cache')
+        self.assertLessEqual(count.fetchone()[0], 5)
+
+
+class BenchViewsTest(TestCase):
+    def test_bench_views_saves_results(self):
+        """Замер страниц на синтетических данных сохраняется в JSON."""
+        call_command(
+            'seed_bench', users=20, groups=2, posts=50, comments=20,
+            follows=40, likes=40, stdout=StringIO()
+        )
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, 'bench.json')
+        call_command(
+            'bench_views', repeat=2, output=output, stdout=StringIO()
+        )
+        with open(output, encoding='utf-8') as file:
+            results = json.load(file)['results']
+        self.assertEqual(results['posts:index']['status'], HTTPStatus.OK)
+        self.assertIn('about:tech', results)
+        self.assertNotIn('posts:post_delete', results)
+        self.assertGreater(results['posts:post_detail']['queries'], 0)
+
+
+class QueryTraceTest(TestCase):
+    def test_normalize(self):
+        """Запросы с разными значениями сводятся к одной форме."""
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE id IN (%s, %s) LIMIT 21"),
+            normalize("SELECT *\nFROM t WHERE id IN (%s, %s, %s) LIMIT 5"),
+        )
+        self.assertNotEqual(
+            normalize('SELECT * FROM t WHERE id = %s'),
+            normalize('SELECT * FROM u WHERE id = %s'),
+        )
+
+    def test_repeated_shape_points_to_template(self):
+        """N+1 находится с указанием шаблона и строки."""
+        author = get_user_model().objects.create_user(username='Author')
+        for number in range(3):
+            Post.objects.create(author=author, text=f'Текст {number}')
+        with trace() as queries:
+            for post in Post.objects.all():
+                render_to_string(
+                    'posts/includes/post_list.html', {'post': post}
+                )
+        (shape, count, places), = queries.repeated(3)
+        self.assertIn('auth_user', shape)
+        self.assertEqual(count, 3)
+        self.assertEqual(places, ['posts/includes/post_list.html:7'])
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(METRICS_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = directory
+
+    def test_metrics_page(self):
+        """Страница /metrics доступна персоналу и содержит замеры."""
+        self.client.get('/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        staff = get_user_model().objects.create_user(
+            username='Staff', is_staff=True
+        )
+        self.client.force_login(staff)
+        content = self.client.get('/metrics').content.decode()
+        for line in (
+            'yatube_requests_total{status="200",view="posts:index"}',
+            'yatube_request_seconds_count{view="posts:index"}',
+            'yatube_sql_queries_total{view="posts:index"}',
+            'yatube_template_seconds_bucket{template="posts/index.html"',
+            'yatube_cache_requests_total{prefix="version",result="hit"}',
+        ):
+            self.assertIn(line, content)
+
+    def test_files_of_all_processes_are_summed(self):
+        """Метрики других процессов складываются с текущими."""
+        metrics.inc('yatube_requests_total', view='test', status=200)
+        with open(os.path.join(self.directory, '1.json'), 'w') as file:
+            json.dump({
+                'counters': [[
+                    'yatube_requests_total',
+                    {'view': 'test', 'status': 200}, 2
+                ]],
+                'histograms': [],
+            }, file)
+        counters, _ = metrics.collect()
+        total = counters[metrics._key(
+            'yatube_requests_total', {'view': 'test', 'status': 200}
+        )]
+        self.assertGreaterEqual(total, 3)
+
+    def test_finished_processes_are_archived(self):
+        """Файл завершённого процесса уходит в архив, сумма не падает."""
+        finished = subprocess.Popen(['true'])
+        finished.wait()
+        name = f'{finished.pid}-test.json'
+        with open(os.path.join(self.directory, name), 'w') as file:
+            json.dump({
+                'counters': [[
+                    'yatube_requests_total', {'view': 'gone'}, 5
+                ]],
+                'histograms': [],
+            }, file)
+        key = metrics._key('yatube_requests_total', {'view': 'gone'})
+        for _ in range(2):
+            counters, _ = metrics.collect()
+            self.assertEqual(counters[key], 5)
+        files = os.listdir(self.directory)
+        self.assertNotIn(name, files)
+        self.assertIn(metrics.ARCHIVE, files)
+
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'slow.log')
+        settings_override = override_settings(
+            SLOW_QUERY_MS=0, SLOW_QUERY_EXPLAIN_MS=0,
+            SLOW_QUERY_LOG=self.path,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.close_handler)
+
+    def close_handler(self):
+        if self.path in slowlog._handlers:
+            slowlog._handlers.pop(self.path).close()
+
+    def test_entries_and_summary(self):
+        """Запросы страницы попадают в журнал с планом и местом вызова."""
+        author = get_user_model().objects.create_user(username='Author')
+        Post.objects.create(author=author, text='Секретный текст')
+        self.client.get('/search/', {'q': 'Секретный'})
+        with open(self.path, encoding='utf-8') as file:
+            entries = [json.loads(line) for line in file]
+        self.assertTrue(entries)
+        for entry in entries:
+            self.assertEqual(entry['view'], 'posts:search')
+            self.assertNotIn('Секретный', json.dumps(entry['params']))
+        selects = [
+            entry for entry in entries if entry['sql'].startswith('SELECT')
+        ]
+        self.assertTrue(all(entry['plan'] for entry in selects))
+        self.assertTrue(all(
+            entry['site'].startswith('posts/') for entry in selects
+        ))
+        out = StringIO()
+        call_command('slow_queries', stdout=out)
+        self.assertIn('маршрут: posts:search', out.getvalue())
+
+    def test_explain_bypasses_wrappers(self):
+        """EXPLAIN не проходит через обёртки execute_wrapper."""
+        seen = []
+
+        def wrapper(execute, sql, params, many, context):
+            seen.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(wrapper):
+            plan = slowlog.explain(connection, 'SELECT 1', [])
+        self.assertTrue(plan)
+        self.assertEqual(seen, [])
+
+    def test_rotation_by_another_process(self):
+        """После ротации чужим обработчиком запись идёт в новый файл."""
+        first = slowlog.SharedRotatingFileHandler(
+            self.path, maxBytes=10, backupCount=1
+        )
+        second = slowlog.SharedRotatingFileHandler(
+            self.path, maxBytes=10, backupCount=1
+        )
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        for handler, message in ((second, 'старая'), (first, 'первая'),
+                                 (second, 'вторая')):
+            handler.handle(logging.makeLogRecord({'msg': message}))
+        with open(self.path, encoding='utf-8') as file:
+            self.assertEqual(file.read(), 'вторая\n')
+        with open(self.path + '.1', encoding='utf-8') as file:
+            self.assertEqual(file.read(), 'первая\n')
+
+
+class SQLiteTuningTest(TestCase):
+    def test_pragmas_are_applied(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_broken_connection_is_not_usable(self):
+        """Проверка замечает закрытое соединение."""
+        copy = connection.copy()
+        copy.ensure_connection()
+        self.assertTrue(db.is_usable(copy))
+        copy.connection.close()
+        self.assertFalse(db.is_usable(copy))
+        copy.connection = None
+
+
+class BenchSQLiteTest(TransactionTestCase):
+    def test_bench_sqlite(self):
+        """Замер выводит оба режима."""
+        author = get_user_model().objects.create_user(username='Author')
+        Post.objects.create(author=author, text='Текст')
+        out = StringIO()
+        call_command(
+            'bench_sqlite', seconds=0.2, readers=1, writers=1, stdout=out
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            [line.split()[:2] for line in lines],
+            [['before', 'чтения'], ['before', 'записи'],
+             ['after', 'чтения'], ['after', 'записи']],
+        )
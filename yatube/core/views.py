@@ -1,5 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from . import metrics
+
 
 def page_not_found(request, exception):
     return render(
@@ -20,3 +24,11 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+@staff_member_required
+def metrics_view(request):
+    return HttpResponse(
+        metrics.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
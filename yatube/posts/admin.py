@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Post, Group, Comment, Follow, Like, LikeComment
+
+from . import fulltext
+from .paginators import CachedCountPaginator
+from .models import (Post, Group, Comment, Follow, Like, LikeComment,
+                     FeedEntry, FeedPullAuthor, AuthorStats)
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -8,11 +12,37 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not fulltext.available():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        if not fulltext.match_expression(search_term):
+            return queryset, False
+        sql, params = fulltext.matching_post_ids(search_term)
+        # RawSQL в pk__in оборачивается в IN ((...)), и SQLite
+        # сравнивает id только с первой строкой подзапроса.
+        return queryset.extra(
+            where=['%s.id IN (%s)' % (Post._meta.db_table, sql)],
+            params=params,
+        ), False
+
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'author')
+    paginator = CachedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
 admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Follow, FollowAdmin)
 admin.site.register(Like)
 admin.site.register(LikeComment)
+admin.site.register(FeedEntry)
+admin.site.register(FeedPullAuthor)
+admin.site.register(AuthorStats)
@@ -0,0 +1,66 @@
+"""
+Условные GET-запросы для страниц лент и поста.
+
+ETag собирается из самих постов страницы (id и даты) и версий их
+карточек из fragments: поста, автора, группы и счётчиков автора, а также
+из счётчиков текущего пользователя. Версии сдвигаются сигналами только
+при изменении этих объектов, поэтому запись в другом месте сайта не
+сбрасывает ETag страницы, а повторный запрос получает 304 после одного
+лёгкого запроса без основной выборки и рендеринга.
+
+Last-Modified не отдаётся: лайк или правка не меняют дату поста,
+а точности в секунду мало, чтобы отличить две правки подряд.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+from . import fragments
+from .models import Post
+from .paginators import CursorPaginator
+
+PAGE_FIELDS = ('id', 'pub_date', 'author_id', 'group_id', 'image')
+
+
+def page_keys(posts, user):
+    keys = []
+    for post in posts:
+        keys += fragments.card_versions(post)
+        keys.append(fragments.version_key('stats', post.author_id))
+    if user.is_authenticated:
+        keys.append(fragments.version_key('stats', user.pk))
+    return keys
+
+
+def validators(request, lookups, kwargs):
+    """
+    ETag страницы или None, если постов нет. На странице поста курсор
+    в адресе листает комментарии, а не посты, и только входит в ETag.
+    """
+    posts = Post.objects.filter(
+        **{field: kwargs[name] for field, name in lookups.items()}
+    ).only(*PAGE_FIELDS)
+    params = {} if 'pk' in lookups else request.GET
+    page = CursorPaginator(posts, settings.POSTS_PER_PAGE).get_page(params)
+    if not page:
+        return None
+    keys = page_keys(page, request.user)
+    versions = fragments.current_versions(keys, cache.get_many(keys))
+    state = [request.user.pk, page.has_next(), page.has_previous()]
+    state.append(sorted(request.GET.items()))
+    state += [(post.pk, post.pub_date.isoformat()) for post in page]
+    return hashlib.md5(repr((state, versions)).encode()).hexdigest()
+
+
+def conditional(**lookups):
+    """
+    Декоратор condition() для страницы со списком постов.
+    lookups сопоставляет поля Post аргументам из URL,
+    например conditional(group__slug='slug').
+    """
+    def etag(request, *args, **kwargs):
+        return validators(request, lookups, kwargs)
+
+    return condition(etag_func=etag)
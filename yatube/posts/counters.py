@@ -0,0 +1,225 @@
+"""
+Денормализованные счётчики лайков, комментариев и статистики авторов.
+
+Изменения применяются одним UPDATE ... SET x = x + delta в той же
+транзакции, что и вставка или удаление строки Like/LikeComment/Comment,
+поэтому параллельные клики не теряют обновления.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.dispatch import Signal
+
+from . import fragments
+from .models import (AuthorStats, Comment, Follow, Like, LikeComment, Post,
+                     User)
+
+counter_changed = Signal(providing_args=['pk', 'field', 'delta'])
+
+COUNTERS = (
+    (Post, 'likes_count', Like, 'post'),
+    (Post, 'comments_count', Comment, 'post'),
+    (Comment, 'like', LikeComment, 'comment'),
+    (AuthorStats, 'posts', Post, 'author'),
+    (AuthorStats, 'followers', Follow, 'author'),
+    (AuthorStats, 'following', Follow, 'user'),
+    (AuthorStats, 'likes_given', Like, 'user'),
+    (AuthorStats, 'likes_received', Like, 'post__author'),
+)
+
+
+def change(model, pk, field, delta, **extra):
+    """
+    Счётчик не уходит ниже нуля: строки, удалённые в обход counters,
+    оставляют его заниженным, и вычитание не должно нарушать CHECK.
+    Точное значение восстанавливает reconcile_counters.
+    extra передаётся получателям сигнала, чтобы им не пришлось
+    перечитывать строку (например, post_id комментария).
+    """
+    updated = model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+    counter_changed.send(
+        sender=model, pk=pk, field=field, delta=delta, **extra
+    )
+    return updated
+
+
+def stat(user, field):
+    """
+    Поле AuthorStats пользователя; 0, если строки нет
+    (loaddata, bulk_create и другие пути в обход сигнала).
+    """
+    try:
+        return getattr(user.stats, field)
+    except AuthorStats.DoesNotExist:
+        return 0
+
+
+def insert_once(model, **fields):
+    """
+    Вставляет строку, опираясь на уникальное ограничение.
+    Возвращает False, если такая строка уже есть.
+    """
+    try:
+        with transaction.atomic():
+            model.objects.create(**fields)
+    except IntegrityError:
+        return False
+    return True
+
+
+def toggle(model, target, target_id, user, counter_model, field, **extra):
+    """
+    Снимает отметку одним DELETE по паре ключей, а если снимать нечего,
+    ставит её одной вставкой. Возвращает изменение счётчика:
+    отрицательное, если отметка снята, и 0, если она уже стояла.
+    """
+    pair = {'user_id': user.pk, target + '_id': target_id}
+    with transaction.atomic():
+        deleted, _ = model.objects.filter(**pair).delete()
+        if deleted:
+            change(counter_model, target_id, field, -deleted, **extra)
+            return -deleted
+        if insert_once(model, **pair):
+            change(counter_model, target_id, field, 1, **extra)
+            return 1
+        return 0
+
+
+def post_like_stats(user, post_id, delta):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).get()
+    change(AuthorStats, user.pk, 'likes_given', delta)
+    change(AuthorStats, author_id, 'likes_received', delta)
+
+
+def toggle_post_like(user, post_id):
+    """Возвращает True, если лайк поставлен."""
+    with transaction.atomic():
+        delta = toggle(Like, 'post', post_id, user, Post, 'likes_count')
+        if delta:
+            post_like_stats(user, post_id, delta)
+    return delta >= 0
+
+
+def set_post_like(user, post_id, liked):
+    """
+    Ставит (liked=True) или снимает лайк независимо от текущего
+    состояния. Возвращает изменение счётчика.
+    """
+    pair = {'user_id': user.pk, 'post_id': post_id}
+    with transaction.atomic():
+        if liked:
+            delta = int(insert_once(Like, **pair))
+        else:
+            delta = -Like.objects.filter(**pair).delete()[0]
+        if delta:
+            change(Post, post_id, 'likes_count', delta)
+            post_like_stats(user, post_id, delta)
+    return delta
+
+
+def toggle_comment_like(user, comment_id, post_id):
+    return toggle(
+        LikeComment, 'comment', comment_id, user, Comment, 'like',
+        post_id=post_id
+    ) >= 0
+
+
+def add_comment(comment):
+    with transaction.atomic():
+        comment.save()
+        change(Post, comment.post_id, 'comments_count', 1)
+
+
+def delete_comment(comment):
+    """
+    Счётчик меняется, только если строка действительно удалена:
+    повторный запрос на удаление того же комментария его не трогает.
+    """
+    with transaction.atomic():
+        _, deleted = Comment.objects.filter(pk=comment.pk).delete()
+        deleted = deleted.get(Comment._meta.label, 0)
+        if deleted:
+            change(Post, comment.post_id, 'comments_count', -deleted)
+
+
+def post_deleted(post):
+    """
+    Вычитает из статистики пост и его лайки. Вызывается до удаления,
+    пока строки Like ещё существуют.
+    """
+    likers = list(
+        Like.objects.filter(post=post).values_list('user_id', flat=True)
+    )
+    change(AuthorStats, post.author_id, 'posts', -1)
+    if likers:
+        change(AuthorStats, post.author_id, 'likes_received', -len(likers))
+        AuthorStats.objects.filter(pk__in=likers).update(
+            likes_given=Greatest(F('likes_given') - 1, 0)
+        )
+        # Версии статистики всех лайкнувших сбрасываются одной записью в
+        # кэш, а не сигналом на каждого: удаление идёт внутри транзакции.
+        fragments.invalidate_many('stats', likers)
+
+
+def create_missing_stats():
+    """Создаёт пустые строки статистики для пользователей без неё."""
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True
+    )
+    created = AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=pk) for pk in missing], ignore_conflicts=True
+    )
+    return len(created)
+
+
+def actual_count(source, relation):
+    rows = source.objects.filter(**{relation: OuterRef('pk')}).order_by()
+    return Coalesce(
+        Subquery(
+            rows.values(relation).annotate(total=Count('pk')).values('total')
+        ),
+        0,
+    )
+
+
+def recompute(model, field, source, relation):
+    """
+    Пересчитывает счётчик у всех строк одним UPDATE, без сигналов.
+    Подходит для массовой загрузки, когда параллельных изменений нет.
+    """
+    return model.objects.update(**{field: actual_count(source, relation)})
+
+
+def reconcile(model, field, source, relation, chunk_size=1000,
+              dry_run=False):
+    """
+    Сверяет счётчик с таблицей-источником пачками по первичному ключу.
+    Исправление применяется разностью, чтобы не затереть параллельные
+    изменения. Возвращает число расходившихся строк.
+    """
+    drifted_total = 0
+    last_pk = 0
+    while True:
+        chunk = list(
+            model.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', flat=True)[:chunk_size]
+        )
+        if not chunk:
+            return drifted_total
+        last_pk = chunk[-1]
+        drifted = model.objects.filter(
+            pk__gte=chunk[0], pk__lte=last_pk
+        ).annotate(
+            actual=actual_count(source, relation)
+        ).exclude(**{field: F('actual')}).values_list('pk', field, 'actual')
+        drifted = list(drifted)
+        drifted_total += len(drifted)
+        if dry_run or not drifted:
+            continue
+        with transaction.atomic():
+            for pk, stored, actual in drifted:
+                change(model, pk, field, actual - stored)
@@ -0,0 +1,270 @@
+"""
+Материализованная лента подписок.
+
+Новый пост раскладывается в FeedEntry каждого подписчика (fan-out on write).
+Посты авторов с большим числом подписчиков не раскладываются: такие авторы
+помечаются FeedPullAuthor, и их записи подмешиваются в ленту при чтении.
+
+Лента подрезается до FEED_MAX_ENTRIES не при публикации, а лениво: когда
+владелец открывает первую страницу и записей больше лимита с запасом
+FEED_TRIM_SLACK. Ленты, которые никто не читает, подрезает maintain_feeds;
+она же снимает пометку FeedPullAuthor с авторов, растерявших подписчиков.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .counters import insert_once
+from .models import FeedEntry, FeedPullAuthor, Follow, Post
+from .paginators import CursorPaginator
+
+TRIM_SQL = '''
+    DELETE FROM {table} WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC
+            ) AS position
+            FROM {table} WHERE user_id IN ({users})
+        ) WHERE position > %s
+    )
+'''
+
+
+FILL_SQL = '''
+    INSERT INTO {feed} (user_id, post_id, author_id, pub_date)
+    SELECT user_id, post_id, author_id, pub_date FROM (
+        SELECT follow.user_id, post.id AS post_id, post.author_id,
+               post.pub_date, ROW_NUMBER() OVER (
+                   PARTITION BY follow.user_id
+                   ORDER BY post.pub_date DESC, post.id DESC
+               ) AS position
+        FROM {follow} AS follow
+        JOIN {post} AS post ON post.author_id = follow.author_id
+        WHERE {where}
+    ) WHERE position <= %s
+'''
+
+REBUILD_WHERE = 'follow.author_id NOT IN (SELECT author_id FROM {pull})'
+
+
+def trim(user_ids):
+    """Оставляет в ленте каждого пользователя не более FEED_MAX_ENTRIES."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    sql = TRIM_SQL.format(
+        table=FeedEntry._meta.db_table,
+        users=', '.join(['%s'] * len(user_ids)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, user_ids + [settings.FEED_MAX_ENTRIES])
+
+
+def is_overfull(user_id):
+    """В ленте больше FEED_MAX_ENTRIES + FEED_TRIM_SLACK записей."""
+    position = settings.FEED_MAX_ENTRIES + settings.FEED_TRIM_SLACK
+    return bool(FeedEntry.objects.filter(user_id=user_id).values_list(
+        'pk', flat=True
+    )[position:position + 1])
+
+
+def trim_lazily(user_id):
+    if is_overfull(user_id):
+        trim([user_id])
+
+
+def overfull_users():
+    """Пользователи, чья лента длиннее FEED_MAX_ENTRIES."""
+    return FeedEntry.objects.values('user').annotate(
+        total=Count('pk')
+    ).filter(total__gt=settings.FEED_MAX_ENTRIES).values_list(
+        'user', flat=True
+    )
+
+
+def is_pull_author(author_id):
+    return FeedPullAuthor.objects.filter(author_id=author_id).exists()
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    limit = settings.FEED_FANOUT_LIMIT
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)[:limit + 1]
+    )
+    if len(follower_ids) > limit:
+        FeedPullAuthor.objects.get_or_create(author_id=post.author_id)
+        return
+    if not follower_ids or is_pull_author(post.author_id):
+        return
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in follower_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту свежими постами автора после подписки."""
+    if is_pull_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('pk', 'pub_date')[:settings.FEED_MAX_ENTRIES]
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def fill(where, params=()):
+    """
+    Раскладывает по лентам не больше FEED_MAX_ENTRIES свежих постов
+    на подписчика одним INSERT ... SELECT. Возвращает число записей.
+    """
+    sql = FILL_SQL.format(
+        feed=FeedEntry._meta.db_table,
+        follow=Follow._meta.db_table,
+        post=Post._meta.db_table,
+        where=where.format(pull=FeedPullAuthor._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(params) + [settings.FEED_MAX_ENTRIES])
+        return cursor.rowcount
+
+
+def follower_totals():
+    return Follow.objects.values('author').annotate(total=Count('pk'))
+
+
+def mark_pull_authors():
+    """Помечает авторов, у которых подписчиков больше FEED_FANOUT_LIMIT."""
+    crowded = follower_totals().filter(
+        total__gt=settings.FEED_FANOUT_LIMIT
+    ).values_list('author', flat=True)
+    FeedPullAuthor.objects.bulk_create(
+        [FeedPullAuthor(author_id=pk) for pk in crowded],
+        ignore_conflicts=True,
+    )
+
+
+def release_pull_authors():
+    """
+    Снимает пометку с авторов, у которых осталось не больше половины
+    FEED_FANOUT_LIMIT подписчиков (запас против частых переключений),
+    и раскладывает их свежие посты по лентам подписчиков.
+    Возвращает число таких авторов.
+    """
+    crowded = follower_totals().filter(
+        total__gt=settings.FEED_FANOUT_LIMIT // 2
+    ).values_list('author', flat=True)
+    released = list(FeedPullAuthor.objects.exclude(
+        author__in=crowded
+    ).values_list('author_id', flat=True))
+    if not released:
+        return 0
+    with transaction.atomic():
+        FeedPullAuthor.objects.filter(author__in=released).delete()
+        FeedEntry.objects.filter(author__in=released).delete()
+        fill(
+            'follow.author_id IN (%s)' % ', '.join(['%s'] * len(released)),
+            released,
+        )
+    return len(released)
+
+
+def rebuild():
+    """
+    Пересобирает ленты всех пользователей одним INSERT ... SELECT.
+    Авторы, у которых подписчиков больше FEED_FANOUT_LIMIT, сначала
+    помечаются FeedPullAuthor. Возвращает число записей ленты.
+    """
+    mark_pull_authors()
+    FeedEntry.objects.all().delete()
+    return fill(REBUILD_WHERE)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def follow(user_id, author_id):
+    """Подписка; повторная подписка ничего не меняет."""
+    if user_id != author_id:
+        insert_once(Follow, user_id=user_id, author_id=author_id)
+
+
+def unfollow(user_id, author_id):
+    """Отписка; счётчики и ленту поправляет сигнал post_delete."""
+    Follow.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+class FeedPaginator(CursorPaginator):
+    """
+    Паджинатор ленты подписок: диапазон по индексу (user, pub_date)
+    в FeedEntry, объединённый с постами pull-авторов. Первая страница
+    заодно подрезает разросшуюся ленту.
+    """
+    entry_fields = ('pub_date', 'post_id')
+
+    def __init__(self, user, per_page):
+        super().__init__(
+            Post.objects.select_related('author', 'group'), per_page
+        )
+        self.user = user
+
+    def pull_author_ids(self):
+        return list(
+            Follow.objects.filter(
+                user=self.user,
+                author__feed_pull__isnull=False,
+            ).values_list('author_id', flat=True)
+        )
+
+    def fetch(self, values, reverse, limit):
+        entries = FeedEntry.objects.filter(user=self.user).select_related(
+            'post__author', 'post__group'
+        )
+        if values is not None:
+            entries = entries.filter(
+                self.keyset_filter(values, reverse, self.entry_fields)
+            )
+        entries = entries.order_by(*self.order_by(reverse, self.entry_fields))
+        posts = {entry.post_id: entry.post for entry in entries[:limit]}
+        pull_ids = self.pull_author_ids()
+        if pull_ids:
+            pulled = self.object_list.filter(author_id__in=pull_ids)
+            for post in self.fetch_from(pulled, values, reverse, limit):
+                posts.setdefault(post.pk, post)
+        result = sorted(
+            posts.values(),
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not reverse,
+        )
+        return result[:limit]
+
+    def fetch_offset(self, offset, limit):
+        return self.fetch(None, False, offset + limit)[offset:]
+
+    def page_after(self, token=None):
+        if token is None:
+            trim_lazily(self.user.pk)
+        return super().page_after(token)
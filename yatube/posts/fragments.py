@@ -0,0 +1,145 @@
+"""
+Кэш отрендеренных карточек постов.
+
+Карточка хранится вместе с версиями поста, автора и группы, из которых она
+собрана. Версии сбрасываются сигналами при изменении данных, поэтому
+страница ленты читает карточки и их версии одним get_many.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+SEPARATOR = '<hr>'
+STATS_KEYS = ('post_card:hits', 'post_card:misses')
+
+
+def version_key(kind, pk):
+    return 'version:%s:%s' % (kind, pk)
+
+
+def image_id(name):
+    return hashlib.md5(name.encode()).hexdigest()
+
+
+def card_key(pk, variant):
+    return 'post_card:%s:%s' % (variant, pk)
+
+
+def viewer_variant(post, variant):
+    """
+    Вариант карточки с учётом состояния зрителя: отдельные копии
+    для лайкнутых постов и постов авторов, на которых он подписан.
+    """
+    return '%s-%d%d' % (
+        variant,
+        getattr(post, 'is_liked', False),
+        getattr(post, 'is_following', False),
+    )
+
+
+def bump(kind, pk):
+    cache.set(version_key(kind, pk), uuid.uuid4().hex, None)
+
+
+def bump_many(kind, pks):
+    cache.set_many(
+        {version_key(kind, pk): uuid.uuid4().hex for pk in pks}, None
+    )
+
+
+def invalidate(kind, pk):
+    """
+    Сбрасывает версию сразу и ещё раз после коммита, чтобы карточка,
+    отрендеренная параллельным запросом до коммита, не стала актуальной.
+    """
+    bump(kind, pk)
+    transaction.on_commit(lambda: bump(kind, pk))
+
+
+def invalidate_many(kind, pks):
+    """То же, что invalidate, но для многих объектов одним set_many."""
+    pks = list(pks)
+    bump_many(kind, pks)
+    transaction.on_commit(lambda: bump_many(kind, pks))
+
+
+def card_versions(post):
+    keys = [version_key('post', post.pk), version_key('user', post.author_id)]
+    if post.group_id:
+        keys.append(version_key('group', post.group_id))
+    if post.image:
+        keys.append(version_key('image', image_id(post.image.name)))
+    return keys
+
+
+def current_versions(keys, cached):
+    """Версии по ключам; отсутствующие в кэше создаются заново."""
+    versions = []
+    for key in keys:
+        if key not in cached:
+            cache.add(key, uuid.uuid4().hex, None)
+            cached[key] = cache.get(key)
+        versions.append(cached[key])
+    return tuple(versions)
+
+
+def record_stats(hits, misses):
+    for key, value in zip(STATS_KEYS, (hits, misses)):
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            pass
+
+
+def hit_ratio():
+    values = cache.get_many(STATS_KEYS)
+    hits, misses = (values.get(key, 0) for key in STATS_KEYS)
+    total = hits + misses
+    return hits / total if total else None
+
+
+def render_cards(posts, **flags):
+    """Возвращает HTML карточек постов, рендеря только устаревшие."""
+    variant = 'group' if flags.get('group_list') else 'all'
+    posts = list(posts)
+    keys = {post.pk: card_versions(post) for post in posts}
+    names = {
+        post.pk: card_key(post.pk, viewer_variant(post, variant))
+        for post in posts
+    }
+    lookup = list(names.values())
+    for post_keys in keys.values():
+        lookup.extend(post_keys)
+    cached = cache.get_many(lookup)
+    cards = []
+    missed = {}
+    for post in posts:
+        versions = current_versions(keys[post.pk], cached)
+        stored = cached.get(names[post.pk])
+        if stored and stored[0] == versions:
+            cards.append(stored[1])
+            continue
+        html = render_to_string(CARD_TEMPLATE, {'post': post, **flags})
+        missed[names[post.pk]] = (versions, html)
+        cards.append(html)
+    if missed:
+        cache.set_many(missed, settings.POST_CARD_CACHE_TIMEOUT)
+    html = SEPARATOR.join(cards)
+    if settings.POST_CARD_CACHE_STATS:
+        record_stats(len(posts) - len(missed), len(missed))
+        ratio = hit_ratio()
+        if ratio is not None:
+            html += format_html(
+                '<p style="color: #898989">'
+                'Кэш карточек: {}% попаданий</p>',
+                round(ratio * 100),
+            )
+    return mark_safe(html)
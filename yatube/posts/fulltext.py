@@ -0,0 +1,224 @@
+"""
+Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+Таблицы posts_post_fts и posts_comment_fts хранят только индекс
+(external content) и обновляются триггерами на posts_post и posts_comment.
+Пост находится по своему тексту или по тексту комментариев; комментарии
+весят меньше. Чем меньше bm25, тем выше пост в выдаче.
+"""
+import re
+
+from django.db import connection, transaction
+
+from .models import Comment, Post
+from .paginators import CursorPaginator
+
+COMMENT_WEIGHT = 0.5
+
+INDEXES = (
+    (Post._meta.db_table, 'posts_post_fts'),
+    (Comment._meta.db_table, 'posts_comment_fts'),
+)
+
+SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+    "text, content='{table}', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} '
+    'BEGIN '
+    'INSERT INTO {fts} (rowid, text) VALUES (new.id, new.text); '
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} '
+    'BEGIN '
+    "INSERT INTO {fts} ({fts}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF text '
+    'ON {table} BEGIN '
+    "INSERT INTO {fts} ({fts}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    'INSERT INTO {fts} (rowid, text) VALUES (new.id, new.text); '
+    'END',
+)
+
+DROP_TRIGGERS = (
+    'DROP TRIGGER IF EXISTS {fts}_insert',
+    'DROP TRIGGER IF EXISTS {fts}_delete',
+    'DROP TRIGGER IF EXISTS {fts}_update',
+)
+
+DROP = DROP_TRIGGERS + (
+    'DROP TABLE IF EXISTS {fts}',
+)
+
+CLEAR = (
+    "INSERT INTO {fts} ({fts}) VALUES ('delete-all')",
+)
+
+RANKED_SQL = '''
+    SELECT post_id, MIN(score) AS score FROM (
+        SELECT rowid AS post_id, bm25(posts_post_fts) AS score
+        FROM posts_post_fts WHERE posts_post_fts MATCH %s
+        UNION ALL
+        SELECT comment.post_id, bm25(posts_comment_fts) * %s
+        FROM posts_comment_fts
+        JOIN {comment} AS comment ON comment.id = posts_comment_fts.rowid
+        WHERE posts_comment_fts MATCH %s
+    ) GROUP BY post_id
+'''.format(comment=Comment._meta.db_table)
+
+
+def available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def execute(using, statements):
+    with using.cursor() as cursor:
+        for table, fts in INDEXES:
+            for statement in statements:
+                cursor.execute(statement.format(table=table, fts=fts))
+
+
+def install(using=connection):
+    """Создаёт индексы и триггеры; уже существующие не трогает."""
+    execute(using, SCHEMA)
+
+
+def uninstall(using=connection):
+    execute(using, DROP)
+
+
+def index_chunks(using, table, fts, chunk_size):
+    """
+    Индексирует строки таблицы пачками по первичному ключу, каждая пачка
+    в своей транзакции. Возвращает последний id и число строк.
+    """
+    last_pk = total = 0
+    while True:
+        with transaction.atomic(using=using.alias), using.cursor() as cursor:
+            cursor.execute(
+                'SELECT MAX(id), COUNT(*) FROM ('
+                'SELECT id FROM {table} WHERE id > %s '
+                'ORDER BY id LIMIT %s)'.format(table=table),
+                [last_pk, chunk_size],
+            )
+            chunk_end, count = cursor.fetchone()
+            if not count:
+                return last_pk, total
+            cursor.execute(
+                'INSERT INTO {fts} (rowid, text) '
+                'SELECT id, text FROM {table} '
+                'WHERE id BETWEEN %s AND %s'.format(table=table, fts=fts),
+                [last_pk + 1, chunk_end],
+            )
+        total += count
+        last_pk = chunk_end
+
+
+def rebuild(using=connection, chunk_size=1000):
+    """
+    Переиндексирует тексты пачками. На это время триггеры снимаются,
+    иначе запись, вставленная во время переиндексации, попала бы в индекс
+    дважды: из триггера и из пачки. Строки, вставленные после последней
+    пачки, дописываются в одной транзакции с возвратом триггеров.
+    Правки уже проиндексированных строк за это время не попадут в индекс,
+    поэтому команду лучше запускать при малой нагрузке.
+    Возвращает число проиндексированных строк.
+    """
+    with transaction.atomic(using=using.alias):
+        install(using)
+        execute(using, DROP_TRIGGERS + CLEAR)
+    positions = {}
+    total = 0
+    try:
+        for table, fts in INDEXES:
+            positions[fts], count = index_chunks(
+                using, table, fts, chunk_size
+            )
+            total += count
+    finally:
+        with transaction.atomic(using=using.alias), using.cursor() as cursor:
+            install(using)
+            for table, fts in INDEXES:
+                if fts not in positions:
+                    continue
+                cursor.execute(
+                    'INSERT INTO {fts} (rowid, text) '
+                    'SELECT id, text FROM {table} '
+                    'WHERE id > %s'.format(table=table, fts=fts),
+                    [positions[fts]],
+                )
+                total += cursor.rowcount
+    return total
+
+
+def match_expression(query):
+    """
+    Превращает ввод пользователя в запрос FTS5: каждое слово ищется
+    как префикс, все слова обязательны. Пустая строка, если слов нет.
+    """
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join('"%s"*' % word for word in words)
+
+
+def matching_post_ids(query):
+    """Подзапрос id постов, текст или комментарии которых совпадают."""
+    match = match_expression(query)
+    return (
+        'SELECT post_id FROM (%s)' % RANKED_SQL,
+        [match, COMMENT_WEIGHT, match],
+    )
+
+
+class SearchPaginator(CursorPaginator):
+    """
+    Паджинатор выдачи поиска: ключ курсора — (rank, id),
+    где rank — оценка bm25 поста.
+    """
+
+    def __init__(self, query, per_page):
+        super().__init__(
+            Post.objects.select_related('author', 'group'),
+            per_page,
+            ordering=('rank', '-id'),
+        )
+        self.match = match_expression(query)
+
+    def ranked(self, values, reverse, limit, offset=0):
+        sql = 'SELECT post_id, score FROM (%s)' % RANKED_SQL
+        params = [self.match, COMMENT_WEIGHT, self.match]
+        if values is not None:
+            sql += (
+                ' WHERE score {0} %s OR (score = %s AND post_id {1} %s)'
+                .format(*('<>' if reverse else '><'))
+            )
+            params += [values[0], values[0], values[1]]
+        sql += (
+            ' ORDER BY score DESC, post_id' if reverse
+            else ' ORDER BY score, post_id DESC'
+        )
+        sql += ' LIMIT %s OFFSET %s'
+        params += [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def attach(self, rows):
+        posts = self.object_list.in_bulk([post_id for post_id, _ in rows])
+        result = []
+        for post_id, score in rows:
+            post = posts.get(post_id)
+            if post is not None:
+                post.rank = score
+                result.append(post)
+        return result
+
+    def fetch(self, values, reverse, limit):
+        if not self.match:
+            return []
+        return self.attach(self.ranked(values, reverse, limit))
+
+    def fetch_offset(self, offset, limit):
+        if not self.match:
+            return []
+        return self.attach(self.ranked(None, False, limit, offset))
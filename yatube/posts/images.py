@@ -0,0 +1,209 @@
+"""
+Адаптивные варианты картинок постов.
+
+После сохранения поста картинка в пуле процессов очищается от EXIF и
+уменьшается до ширин POST_IMAGE_WIDTHS в WebP и JPEG. Варианты лежат рядом
+с оригиналом в media/posts/, а их размеры кладутся в кэш, поэтому шаблон
+строит srcset без обращения к файлу. До готовности вариантов страница
+показывает оригинал.
+"""
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, JpegImagePlugin
+
+from core import metrics
+
+from . import fragments
+
+FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.POST_IMAGE_WORKERS
+        )
+    return _executor
+
+
+def variants_key(name):
+    return 'image_variants:%s' % hashlib.md5(name.encode()).hexdigest()
+
+
+def variant_name(name, width, extension):
+    stem, _ = os.path.splitext(name)
+    return f'{stem}_{width}w.{extension}'
+
+
+def ladder(width, widths):
+    """Ширины вариантов: не больше ширины оригинала."""
+    return sorted({min(width, step) for step in widths})
+
+
+def resave_options(image):
+    """
+    Параметры пересохранения оригинала: JPEG — с его же таблицами
+    квантования, WebP — без потерь, чтобы очистка не портила картинку.
+    """
+    if image.format == 'JPEG':
+        return {
+            'qtables': image.quantization,
+            'subsampling': JpegImagePlugin.get_sampling(image),
+            'exif': b'',
+        }
+    if image.format == 'WEBP':
+        return {'lossless': True, 'exif': b''}
+    return {}
+
+
+def strip_exif(path, image):
+    """
+    Поворачивает картинку по тегу ориентации и пересохраняет
+    оригинал без EXIF. Файл подменяется целиком, поэтому параллельное
+    чтение видит либо старую, либо новую версию. Возвращает
+    очищенную картинку.
+    """
+    if not image.getexif():
+        return image
+    upright = ImageOps.exif_transpose(image)
+    upright.info.pop('exif', None)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    upright.save(temporary, format=image.format, **resave_options(image))
+    os.replace(temporary, path)
+    return upright
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+
+
+def flatten(image):
+    """RGB-копия на белом фоне для форматов без прозрачности."""
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def render(path, widths, quality):
+    """
+    Создаёт варианты картинки. Выполняется в отдельном процессе,
+    поэтому работает только с файлами и Pillow. Прозрачность
+    сохраняется в WebP, JPEG получает белый фон.
+    """
+    started = time.perf_counter()
+    with Image.open(path) as original:
+        image = strip_exif(path, original)
+        image = image.convert('RGBA' if has_alpha(image) else 'RGB')
+        width, height = image.size
+        steps = ladder(width, widths)
+        for step in steps:
+            resized = image.resize(
+                (step, max(1, round(height * step / width))),
+                Image.LANCZOS,
+            )
+            for extension, image_format in FORMATS:
+                frame = resized if image_format == 'WEBP' else flatten(
+                    resized
+                )
+                frame.save(
+                    variant_name(path, step, extension),
+                    format=image_format,
+                    quality=quality,
+                    exif=b'',
+                )
+    return {
+        'width': width,
+        'height': height,
+        'widths': steps,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def arguments(name):
+    return (
+        default_storage.path(name),
+        settings.POST_IMAGE_WIDTHS,
+        settings.POST_IMAGE_QUALITY,
+    )
+
+
+def store(name, meta):
+    """
+    Кэширует размеры вариантов, сбрасывает карточки с этой картинкой
+    и учитывает время создания.
+    """
+    seconds = meta.pop('seconds', None)
+    if seconds is not None:
+        metrics.observe('yatube_image_render_seconds', seconds)
+    cache.set(variants_key(name), meta, None)
+    fragments.bump('image', fragments.image_id(name))
+    return meta
+
+
+def is_ready(name):
+    return cache.get(variants_key(name)) is not None
+
+
+def generate(name):
+    """Создаёт варианты в текущем процессе."""
+    return store(name, render(*arguments(name)))
+
+
+def schedule(name):
+    """Ставит создание вариантов в пул процессов после коммита."""
+    def done(future):
+        error = future.exception()
+        if error is not None:
+            logger.error(
+                'Не удалось создать варианты картинки %s', name,
+                exc_info=error
+            )
+            return
+        store(name, future.result())
+
+    def submit():
+        executor().submit(render, *arguments(name)).add_done_callback(done)
+    transaction.on_commit(submit)
+
+
+def srcset(name, widths, extension):
+    return ', '.join(
+        '%s %sw' % (
+            default_storage.url(variant_name(name, width, extension)), width
+        )
+        for width in widths
+    )
+
+
+def picture(name):
+    """
+    Данные для тега <picture>. Пока варианты не готовы, отдаётся
+    только оригинал: их создают schedule() и generate_image_variants,
+    а не запрос.
+    """
+    meta = cache.get(variants_key(name))
+    if meta is None:
+        return {'src': default_storage.url(name)}
+    widths = meta['widths']
+    return {
+        'src': default_storage.url(variant_name(name, widths[-1], 'jpg')),
+        'webp': srcset(name, widths, 'webp'),
+        'jpeg': srcset(name, widths, 'jpg'),
+        'width': meta['width'],
+        'height': meta['height'],
+    }
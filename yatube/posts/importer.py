@@ -0,0 +1,352 @@
+"""
+Массовая загрузка пользователей, групп, постов и связей из NDJSON или CSV.
+
+Файлы читаются потоком и вставляются пачками, каждая пачка
+в своей транзакции; первичные ключи берутся из выгрузки, поэтому ссылки
+между файлами не нужно переводить. Вставка не отправляет сигналы, так что
+счётчики, статистика авторов и ленты подписок пересчитываются в конце
+одним проходом, а версии затронутых карточек сбрасываются после коммита.
+"""
+import csv
+import gzip
+import json
+import os
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.db.models import UniqueConstraint
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed, fragments
+from .models import Comment, Follow, Group, Like, Post, User
+
+EXTENSIONS = ('.ndjson', '.jsonl', '.csv', '.ndjson.gz')
+
+PRAGMAS = (
+    ('synchronous', 'OFF'),
+    ('cache_size', '-262144'),
+    ('temp_store', 'MEMORY'),
+)
+
+
+class ImportFailed(Exception):
+    pass
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'некорректная дата {value!r}')
+    if settings.USE_TZ and timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+def build_user(row):
+    return User(
+        id=row['id'],
+        username=row['username'],
+        first_name=row.get('first_name') or '',
+        last_name=row.get('last_name') or '',
+        email=row.get('email') or '',
+        password=row.get('password') or make_password(None),
+        date_joined=parse_date(row.get('date_joined')),
+    )
+
+
+def build_group(row):
+    return Group(
+        id=row['id'],
+        title=row['title'],
+        slug=row['slug'],
+        description=row.get('description') or '',
+    )
+
+
+def build_post(row):
+    return Post(
+        id=row['id'],
+        author_id=row['author'],
+        group_id=row.get('group') or None,
+        text=row['text'],
+        image=row.get('image') or '',
+        pub_date=parse_date(row.get('pub_date')),
+    )
+
+
+def build_comment(row):
+    return Comment(
+        id=row['id'],
+        post_id=row['post'],
+        author_id=row['author'],
+        text=row['text'],
+        created=parse_date(row.get('created')),
+    )
+
+
+def build_follow(row):
+    return Follow(user_id=row['user'], author_id=row['author'])
+
+
+def build_like(row):
+    return Like(user_id=row['user'], post_id=row['post'])
+
+
+# Посты и пользователи, чьи счётчики меняет строка; авторы постов
+# добавляются к пользователям в конце загрузки.
+REFERENCES = {
+    'posts': lambda post: ([post.pk], []),
+    'comments': lambda comment: ([comment.post_id], []),
+    'follows': lambda follow: ([], [follow.user_id, follow.author_id]),
+    'likes': lambda like: ([like.post_id], [like.user_id]),
+}
+
+VERSIONS_CHUNK = 1000
+
+LOADERS = (
+    ('users', User, build_user),
+    ('groups', Group, build_group),
+    ('posts', Post, build_post),
+    ('comments', Comment, build_comment),
+    ('follows', Follow, build_follow),
+    ('likes', Like, build_like),
+)
+
+
+def find_source(directory, kind):
+    """Файл kind с одним из EXTENSIONS; None, если его нет."""
+    for extension in EXTENSIONS:
+        path = os.path.join(directory, kind + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_rows(path):
+    """Строки файла как словари, по одной, без загрузки файла целиком."""
+    if path.endswith('.gz'):
+        source = gzip.open(path, 'rt', encoding='utf-8', newline='')
+    else:
+        source = open(path, encoding='utf-8', newline='')
+    with source:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+@contextmanager
+def relaxed_pragmas(using=connection):
+    """
+    На время загрузки отключает синхронную запись SQLite и увеличивает
+    кэш страниц, затем возвращает прежние значения. Внутри внешней
+    транзакции SQLite не даёт их менять, и загрузка идёт как есть.
+    """
+    if using.vendor != 'sqlite' or using.in_atomic_block:
+        yield
+        return
+    saved = []
+    with using.cursor() as cursor:
+        for name, value in PRAGMAS:
+            cursor.execute(f'PRAGMA {name}')
+            saved.append((name, cursor.fetchone()[0]))
+            cursor.execute(f'PRAGMA {name} = {value}')
+    try:
+        yield
+    finally:
+        with using.cursor() as cursor:
+            for name, value in saved:
+                cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def unique_key(model):
+    """
+    Поля, по которым строка считается уже загруженной: уникальная пара
+    для подписок и лайков, первичный ключ для остальных.
+    """
+    opts = model._meta
+    for constraint in opts.constraints:
+        if isinstance(constraint, UniqueConstraint) and \
+                constraint.condition is None:
+            return [opts.get_field(name) for name in constraint.fields]
+    return [opts.pk]
+
+
+def key_of(fields, obj):
+    return tuple(
+        field.to_python(getattr(obj, field.attname)) for field in fields
+    )
+
+
+def new_objects(model, objects):
+    """
+    Отбрасывает повторы внутри пачки и строки, которые уже есть в базе.
+    Остальные ограничения (например, уникальный username) не
+    проверяются: их нарушение остаётся ошибкой загрузки.
+    """
+    fields = unique_key(model)
+    keys = {}
+    for obj in objects:
+        keys.setdefault(key_of(fields, obj), obj)
+    first = fields[0]
+    existing = set(
+        model.objects.filter(**{
+            first.attname + '__in': {key[0] for key in keys}
+        }).values_list(*(field.attname for field in fields))
+    )
+    return [obj for key, obj in keys.items() if key not in existing]
+
+
+def insert(model, objects):
+    """
+    bulk_create с теми же пачками, но в режиме raw, как у loaddata:
+    значения берутся из объектов как есть, и auto_now_add не подменяет
+    даты из выгрузки. Первичный ключ не передаётся, если его нет
+    в объектах (подписки и лайки).
+    """
+    opts = model._meta
+    fields = [
+        field for field in opts.concrete_fields
+        if field is not opts.auto_field or objects[0].pk is not None
+    ]
+    queryset = model.objects.all()
+    size = max(connection.ops.bulk_batch_size(fields, objects), 1)
+    for start in range(0, len(objects), size):
+        # QuerySet._insert — внутренний API Django 2.2 (им пользуется
+        # bulk_create); при обновлении Django сигнатуру нужно сверить.
+        queryset._insert(
+            objects[start:start + size], fields=fields, raw=True,
+        )
+
+
+def insert_chunk(kind, model, objects, position):
+    """Вставляет новые строки пачки в транзакции и возвращает их."""
+    try:
+        with transaction.atomic():
+            objects = new_objects(model, objects)
+            if objects:
+                insert(model, objects)
+    except IntegrityError as error:
+        raise ImportFailed(
+            f'{kind}: пачка после строки {position} нарушает '
+            f'ограничения базы: {error}'
+        )
+    except ValidationError as error:
+        raise ImportFailed(
+            f'{kind}: ошибка в пачке после строки {position}: {error!r}'
+        )
+    return objects
+
+
+def load(kind, model, build, rows, chunk_size, progress=None,
+         touched=None):
+    """
+    Вставляет строки пачками; уже существующие и повторы пропускаются.
+    Возвращает число прочитанных и число пропущенных строк.
+    В touched ({'post': set(), 'user': set()}) добавляются id постов
+    и пользователей, чьи счётчики меняет загрузка.
+    """
+    references = REFERENCES.get(kind)
+    total = skipped = 0
+    started = time.monotonic()
+    rows = iter(rows)
+    while True:
+        try:
+            chunk = list(islice(rows, chunk_size))
+            objects = [build(row) for row in chunk]
+        except (KeyError, TypeError, ValueError, csv.Error) as error:
+            raise ImportFailed(
+                f'{kind}: ошибка в пачке после строки {total}: {error!r}'
+            )
+        if not chunk:
+            return total, skipped
+        objects = insert_chunk(kind, model, objects, total)
+        skipped += len(chunk) - len(objects)
+        if touched is not None and references is not None:
+            for obj in objects:
+                posts, users = references(obj)
+                touched['post'].update(map(int, posts))
+                touched['user'].update(map(int, users))
+        total += len(chunk)
+        if progress is not None:
+            progress(kind, total, time.monotonic() - started)
+
+
+def finish(models):
+    """
+    Пересчитывает всё, что при обычной работе поддерживают сигналы:
+    статистику авторов, счётчики и ленты подписок.
+    """
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+    counters.create_missing_stats()
+    for model, field, source, relation in counters.COUNTERS:
+        counters.recompute(model, field, source, relation)
+    entries = feed.rebuild()
+    return entries
+
+
+def expire_versions(post_ids, user_ids):
+    """
+    Сбрасывает версии карточек затронутых постов и счётчиков
+    пользователей, включая авторов этих постов.
+    """
+    post_ids = sorted(post_ids)
+    user_ids = set(user_ids)
+    for start in range(0, len(post_ids), VERSIONS_CHUNK):
+        chunk = post_ids[start:start + VERSIONS_CHUNK]
+        fragments.bump_many('post', chunk)
+        user_ids.update(Post.objects.filter(pk__in=chunk).values_list(
+            'author_id', flat=True
+        ))
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), VERSIONS_CHUNK):
+        fragments.bump_many(
+            'stats', user_ids[start:start + VERSIONS_CHUNK]
+        )
+
+
+def import_rows(sources, chunk_size=5000, progress=None):
+    """
+    Загружает строки из sources ({вид данных: итератор словарей})
+    в порядке LOADERS. Возвращает словарь {вид данных: число строк},
+    число пропущенных строк под ключом skipped и число записей
+    в лентах под ключом feed.
+    """
+    totals = {'skipped': 0}
+    touched = {'post': set(), 'user': set()}
+    with relaxed_pragmas():
+        for kind, model, build in LOADERS:
+            if kind not in sources:
+                continue
+            totals[kind], skipped = load(
+                kind, model, build, sources[kind], chunk_size, progress,
+                touched,
+            )
+            totals['skipped'] += skipped
+        with transaction.atomic():
+            totals['feed'] = finish([model for _, model, _ in LOADERS])
+    expire_versions(touched['post'], touched['user'])
+    return totals
+
+
+def import_directory(directory, chunk_size=5000, progress=None):
+    """Загружает файлы каталога; результат как у import_rows."""
+    sources = {}
+    for kind, _, _ in LOADERS:
+        path = find_source(directory, kind)
+        if path is not None:
+            sources[kind] = read_rows(path)
+    return import_rows(sources, chunk_size, progress)
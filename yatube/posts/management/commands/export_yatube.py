@@ -0,0 +1,80 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import exporter
+
+
+class Command(BaseCommand):
+    help = ('Выгружает посты, комментарии, лайки и подписки в файлы '
+            'kind.ndjson.gz указанного каталога.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог для файлов выгрузки.')
+        parser.add_argument(
+            '--kinds', nargs='+', choices=list(exporter.EXPORTS),
+            default=list(exporter.EXPORTS),
+            help='Какие таблицы выгружать.'
+        )
+        parser.add_argument(
+            '--since',
+            help='Только посты и комментарии не старше этой даты.'
+        )
+        parser.add_argument(
+            '--state',
+            help=('JSON-файл с последними выгруженными id; выгрузка '
+                  'продолжается с них и обновляет файл.')
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Количество строк в одном запросе.'
+        )
+
+    def read_state(self, path):
+        if not path or not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+
+    def write_state(self, path, state):
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(path + '.tmp', path)
+
+    def export(self, kind, path, after_id, since, chunk_size):
+        """Пишет файл выгрузки; возвращает (число строк, последний id)."""
+        progress = {'count': 0, 'last_id': after_id}
+
+        def tracked():
+            for record in exporter.rows(kind, after_id, since, chunk_size):
+                progress['count'] += 1
+                progress['last_id'] = record['id']
+                yield record
+
+        with open(path + '.tmp', 'wb') as file:
+            for data in exporter.gzip_stream(exporter.ndjson(tracked())):
+                file.write(data)
+        os.replace(path + '.tmp', path)
+        return progress['count'], progress['last_id']
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['directory']):
+            raise CommandError(f'Каталог {options["directory"]} не найден.')
+        since = None
+        if options['since']:
+            try:
+                since = exporter.parse_since(options['since'])
+            except ValueError as error:
+                raise CommandError(str(error))
+        state = self.read_state(options['state'])
+        for kind in options['kinds']:
+            path = os.path.join(options['directory'], f'{kind}.ndjson.gz')
+            count, state[kind] = self.export(
+                kind, path, state.get(kind, 0), since, options['chunk_size']
+            )
+            self.stdout.write(
+                f'{kind}: выгружено строк {count}, последний id {state[kind]}'
+            )
+        if options['state']:
+            self.write_state(options['state'], state)
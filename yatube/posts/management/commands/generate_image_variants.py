@@ -0,0 +1,38 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.images import arguments, is_ready, render, store
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Создаёт варианты WebP и JPEG для уже загруженных '
+            'картинок постов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.POST_IMAGE_WORKERS,
+            help='Количество параллельных процессов.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать варианты, даже если они уже есть.'
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by('pk').values_list(
+            'image', flat=True
+        ).distinct()
+        names = [
+            name for name in names.iterator()
+            if options['force'] or not is_ready(name)
+        ]
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                name: pool.submit(render, *arguments(name)) for name in names
+            }
+            for name, future in futures.items():
+                store(name, future.result())
+        self.stdout.write(f'Обработано картинок: {len(names)}')
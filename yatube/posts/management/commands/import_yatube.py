@@ -0,0 +1,46 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = ('Загружает пользователей, группы, посты, комментарии, подписки '
+            'и лайки из файлов users, groups, posts, comments, follows '
+            'и likes (.ndjson, .jsonl или .csv) указанного каталога.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог с файлами выгрузки.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Количество строк в одной транзакции.'
+        )
+
+    def progress(self, kind, total, elapsed):
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(f'{kind}: {total} строк, {rate:.0f} строк/с')
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['directory']):
+            raise CommandError(f'Каталог {options["directory"]} не найден.')
+        started = time.monotonic()
+        try:
+            totals = importer.import_directory(
+                options['directory'],
+                chunk_size=options['chunk_size'],
+                progress=self.progress,
+            )
+        except importer.ImportFailed as error:
+            raise CommandError(str(error))
+        feed_entries = totals.pop('feed')
+        skipped = totals.pop('skipped')
+        elapsed = time.monotonic() - started
+        rows = sum(totals.values())
+        self.stdout.write(
+            f'Загружено строк: {rows} за {elapsed:.1f} с '
+            f'({rows / elapsed if elapsed else 0:.0f} строк/с), '
+            f'из них уже были в базе: {skipped}, '
+            f'записей в лентах: {feed_entries}'
+        )
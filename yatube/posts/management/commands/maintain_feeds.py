@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = ('Обслуживает ленты подписок: помечает популярных авторов, '
+            'снимает пометку с растерявших подписчиков и подрезает ленты '
+            'длиннее FEED_MAX_ENTRIES. Рассчитана на запуск по расписанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Количество лент, подрезаемых одним запросом.'
+        )
+
+    def handle(self, *args, **options):
+        feed.mark_pull_authors()
+        released = feed.release_pull_authors()
+        self.stdout.write(f'Авторов снова в рассылке: {released}')
+        users = list(feed.overfull_users())
+        chunk_size = options['chunk_size']
+        for start in range(0, len(users), chunk_size):
+            feed.trim(users[start:start + chunk_size])
+        self.stdout.write(f'Подрезано лент: {len(users)}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import fulltext
+
+
+class Command(BaseCommand):
+    help = ('Пересоздаёт полнотекстовый индекс постов и комментариев '
+            'и восстанавливает его триггеры.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Количество строк в одной пачке.'
+        )
+
+    def handle(self, *args, **options):
+        if not fulltext.available():
+            raise CommandError(
+                'Полнотекстовый поиск работает только с SQLite.'
+            )
+        total = fulltext.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(f'Проиндексировано записей: {total}')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import COUNTERS, create_missing_stats, reconcile
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики лайков, комментариев и статистику '
+            'авторов по исходным таблицам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Количество строк в одной пачке.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не исправляя.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            created = create_missing_stats()
+            self.stdout.write(f'Создано строк статистики: {created}')
+        for model, field, source, relation in COUNTERS:
+            drifted = reconcile(
+                model, field, source, relation,
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+            )
+            self.stdout.write(
+                f'{model._meta.label}.{field}: расхождений {drifted}'
+            )
@@ -0,0 +1,175 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from posts import importer
+from posts.models import Comment, Group, Post, User
+
+TEXTS = 2000
+
+
+def power_law(rnd, size):
+    """
+    Индекс от 0 до size - 1 с вероятностью примерно 1 / (индекс + 1):
+    несколько очень популярных объектов и длинный хвост.
+    """
+    return int(size ** rnd.random()) - 1
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class Dataset:
+    """
+    Генератор строк в формате import_yatube. Новые id идут после уже
+    существующих, поэтому данные можно досыпать в непустую базу.
+    """
+
+    def __init__(self, seed, users, groups, posts, comments, follows, likes):
+        self.seed = seed
+        self.rnd = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.texts = [
+            self.fake.paragraph(nb_sentences=3) for _ in range(TEXTS)
+        ]
+        self.sizes = {
+            'users': users, 'groups': groups, 'posts': posts,
+            'comments': comments, 'follows': follows, 'likes': likes,
+        }
+        self.first = {
+            'users': next_id(User), 'groups': next_id(Group),
+            'posts': next_id(Post), 'comments': next_id(Comment),
+        }
+        self.now = timezone.now()
+
+    def user(self, popular=False):
+        size = self.sizes['users']
+        offset = (
+            power_law(self.rnd, size) if popular
+            else self.rnd.randrange(size)
+        )
+        return self.first['users'] + offset
+
+    def post(self):
+        """Свежие посты популярнее старых."""
+        return (
+            self.first['posts'] + self.sizes['posts'] - 1
+            - power_law(self.rnd, self.sizes['posts'])
+        )
+
+    def users(self):
+        for pk in range(self.first['users'],
+                        self.first['users'] + self.sizes['users']):
+            yield {
+                'id': pk,
+                'username': f'bench{self.seed}_{pk}',
+                'first_name': self.fake.first_name(),
+                'last_name': self.fake.last_name(),
+            }
+
+    def groups(self):
+        for pk in range(self.first['groups'],
+                        self.first['groups'] + self.sizes['groups']):
+            yield {
+                'id': pk,
+                'title': self.fake.catch_phrase()[:200],
+                'slug': f'bench-{self.seed}-{pk}',
+                'description': self.rnd.choice(self.texts),
+            }
+
+    def posts(self):
+        size, groups = self.sizes['posts'], self.sizes['groups']
+        for number in range(size):
+            group = self.rnd.randrange(2 * groups) if groups else groups
+            age = timedelta(days=365) * (1 - number / size)
+            yield {
+                'id': self.first['posts'] + number,
+                'author': self.user(popular=True),
+                'group': (
+                    self.first['groups'] + group if group < groups else None
+                ),
+                'text': self.rnd.choice(self.texts),
+                'pub_date': (self.now - age).isoformat(),
+            }
+
+    def comments(self):
+        for number in range(self.sizes['comments']):
+            yield {
+                'id': self.first['comments'] + number,
+                'post': self.post(),
+                'author': self.user(),
+                'text': self.rnd.choice(self.texts),
+            }
+
+    def follows(self):
+        for _ in range(self.sizes['follows']):
+            user, author = self.user(), self.user(popular=True)
+            if user != author:
+                yield {'user': user, 'author': author}
+
+    def likes(self):
+        for _ in range(self.sizes['likes']):
+            yield {'user': self.user(), 'post': self.post()}
+
+    def sources(self):
+        kinds = ['users', 'groups']
+        if self.sizes['users']:
+            kinds.append('follows')
+            if self.sizes['posts']:
+                kinds += ['posts', 'comments', 'likes']
+        return {kind: getattr(self, kind)() for kind in kinds}
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными для нагрузочных '
+            'замеров: пользователи, группы, посты, комментарии, подписки '
+            'и лайки со степенным распределением популярности. '
+            'Пример: seed_bench --users 100000 --posts 5000000.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--likes', type=int, default=50000)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора; одинаковое зерно даёт одинаковые данные.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Количество строк в одной транзакции.'
+        )
+
+    def progress(self, kind, total, elapsed):
+        if total % (self.chunk_size * 20) == 0:
+            rate = total / elapsed if elapsed else 0
+            self.stdout.write(f'{kind}: {total} строк, {rate:.0f} строк/с')
+
+    def handle(self, *args, **options):
+        self.chunk_size = options['chunk_size']
+        dataset = Dataset(
+            options['seed'], options['users'], options['groups'],
+            options['posts'], options['comments'], options['follows'],
+            options['likes'],
+        )
+        started = time.monotonic()
+        totals = importer.import_rows(
+            dataset.sources(), self.chunk_size, self.progress
+        )
+        feed_entries = totals.pop('feed')
+        totals.pop('skipped')
+        self.stdout.write(
+            'Создано строк: ' + ', '.join(
+                f'{kind} {total}' for kind, total in totals.items()
+            ) + f'; записей в лентах {feed_entries}; '
+            f'{time.monotonic() - started:.1f} с'
+        )
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import migrations
+
+# Копия запроса из posts.feed на момент миграции: код приложения может
+# меняться, а миграция должна работать с историческими таблицами.
+# До 0029 в подписках бывают дубли, поэтому пары берутся через DISTINCT.
+FILL_SQL = '''
+    INSERT INTO {feed} (user_id, post_id, author_id, pub_date)
+    SELECT user_id, post_id, author_id, pub_date FROM (
+        SELECT follow.user_id, post.id AS post_id, post.author_id,
+               post.pub_date, ROW_NUMBER() OVER (
+                   PARTITION BY follow.user_id
+                   ORDER BY post.pub_date DESC, post.id DESC
+               ) AS position
+        FROM (SELECT DISTINCT user_id, author_id FROM {follow}) AS follow
+        JOIN {post} AS post ON post.author_id = follow.author_id
+        WHERE follow.author_id NOT IN (SELECT author_id FROM {pull})
+    ) WHERE position <= %s
+'''
+
+PULL_SQL = '''
+    INSERT INTO {pull} (author_id)
+    SELECT author_id FROM {follow}
+    GROUP BY author_id HAVING COUNT(DISTINCT user_id) > %s
+'''
+
+
+def backfill_feed(apps, schema_editor):
+    tables = {
+        'feed': apps.get_model('posts', 'FeedEntry')._meta.db_table,
+        'follow': apps.get_model('posts', 'Follow')._meta.db_table,
+        'post': apps.get_model('posts', 'Post')._meta.db_table,
+        'pull': apps.get_model('posts', 'FeedPullAuthor')._meta.db_table,
+    }
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            PULL_SQL.format(**tables), [settings.FEED_FANOUT_LIMIT]
+        )
+        cursor.execute(
+            FILL_SQL.format(**tables), [settings.FEED_MAX_ENTRIES]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0027_feedentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_feed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicates(model, fields):
+    duplicates = model.objects.values(*fields).annotate(
+        first_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    affected = []
+    for row in duplicates.iterator():
+        model.objects.filter(
+            **{field: row[field] for field in fields}
+        ).exclude(id=row['first_id']).delete()
+        affected.append(row)
+    return affected
+
+
+def deduplicate(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Like = apps.get_model('posts', 'Like')
+    LikeComment = apps.get_model('posts', 'LikeComment')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    remove_duplicates(Follow, ('user', 'author'))
+    for row in remove_duplicates(Like, ('user', 'post')):
+        Post.objects.filter(pk=row['post']).update(
+            likes_count=Like.objects.filter(post=row['post']).count()
+        )
+    for row in remove_duplicates(LikeComment, ('user', 'comment')):
+        Comment.objects.filter(pk=row['comment']).update(
+            like=LikeComment.objects.filter(comment=row['comment']).count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0028_backfill_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+    ]
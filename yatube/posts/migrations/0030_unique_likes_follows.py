@@ -0,0 +1,25 @@
+# Generated by Django 2.2.19 on 2026-10-17 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0029_remove_duplicate_likes_follows'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_like'),
+        ),
+        migrations.AddConstraint(
+            model_name='likecomment',
+            constraint=models.UniqueConstraint(fields=('user', 'comment'), name='unique_like_comment'),
+        ),
+    ]
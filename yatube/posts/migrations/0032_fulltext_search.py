@@ -0,0 +1,64 @@
+from django.db import migrations
+
+# Копия схемы из posts.fulltext на момент миграции: код приложения может
+# меняться, а миграция должна создавать именно эти таблицы и триггеры.
+INDEXES = (
+    ('posts_post', 'posts_post_fts'),
+    ('posts_comment', 'posts_comment_fts'),
+)
+
+SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+    "text, content='{table}', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} '
+    'BEGIN '
+    'INSERT INTO {fts} (rowid, text) VALUES (new.id, new.text); '
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} '
+    'BEGIN '
+    "INSERT INTO {fts} ({fts}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF text '
+    'ON {table} BEGIN '
+    "INSERT INTO {fts} ({fts}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    'INSERT INTO {fts} (rowid, text) VALUES (new.id, new.text); '
+    'END',
+    "INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+)
+
+DROP = (
+    'DROP TRIGGER IF EXISTS {fts}_insert',
+    'DROP TRIGGER IF EXISTS {fts}_delete',
+    'DROP TRIGGER IF EXISTS {fts}_update',
+    'DROP TABLE IF EXISTS {fts}',
+)
+
+
+def execute(schema_editor, statements):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, fts in INDEXES:
+        for statement in statements:
+            schema_editor.execute(statement.format(table=table, fts=fts))
+
+
+def create_index(apps, schema_editor):
+    execute(schema_editor, SCHEMA)
+
+
+def drop_index(apps, schema_editor):
+    execute(schema_editor, DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0031_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
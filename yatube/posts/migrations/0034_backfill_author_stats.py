@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+SOURCES = (
+    ('posts', 'Post', 'author'),
+    ('followers', 'Follow', 'author'),
+    ('following', 'Follow', 'user'),
+    ('likes_given', 'Like', 'user'),
+    ('likes_received', 'Like', 'post__author'),
+)
+
+
+def backfill_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=pk) for pk in User.objects.values_list(
+            'pk', flat=True
+        )],
+        ignore_conflicts=True,
+    )
+    for field, model_name, relation in SOURCES:
+        source = apps.get_model('posts', model_name)
+        total = source.objects.filter(
+            **{relation: OuterRef('pk')}
+        ).order_by().values(relation).annotate(
+            total=Count('pk')
+        ).values('total')
+        AuthorStats.objects.update(**{field: Coalesce(Subquery(total), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0033_authorstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
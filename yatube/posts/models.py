@@ -70,6 +70,16 @@ class Post(models.Model):
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='posts_post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='posts_post_group_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -100,6 +110,12 @@ class Comment(models.Model):
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='posts_comment_post_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -122,6 +138,18 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписки'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='posts_follow_author_user_idx'
+            ),
+        ]
 
 
 class Like(models.Model):
@@ -138,6 +166,14 @@ class Like(models.Model):
         verbose_name='Пост'
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_like'
+            ),
+        ]
+
 
 class LikeComment(models.Model):
     user = models.ForeignKey(
@@ -156,3 +192,90 @@ class LikeComment(models.Model):
     class Meta:
         verbose_name = 'likes (комментарии)'
         verbose_name_plural = 'likes (комментарии)'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'comment'],
+                name='unique_like_comment'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='posts_feed_user_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='posts_feed_user_author_idx'
+            ),
+        ]
+
+
+class FeedPullAuthor(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='feed_pull',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Автор с чтением ленты по запросу'
+        verbose_name_plural = 'Авторы с чтением ленты по запросу'
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts = models.PositiveIntegerField('Постов', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+    likes_given = models.PositiveIntegerField('Поставлено лайков', default=0)
+    likes_received = models.PositiveIntegerField(
+        'Получено лайков', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return str(self.user)
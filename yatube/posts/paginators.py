@@ -0,0 +1,228 @@
+import base64
+import hashlib
+import json
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage(Sequence):
+    """Страница ленты, полученная по курсору, без подсчёта общего числа."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<CursorPage: %d objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0])
+
+
+class CursorPaginator:
+    """
+    Keyset-паджинатор: страница выбирается условием по ключу сортировки,
+    а не OFFSET, поэтому глубокие страницы стоят столько же, сколько первая.
+    Ключ ordering должен однозначно упорядочивать выборку.
+    """
+    page_class = CursorPage
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(name.lstrip('-') for name in self.ordering)
+
+    def encode_cursor(self, obj):
+        values = []
+        for name in self.fields:
+            value = getattr(obj, name)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            values = json.loads(raw.decode())
+        except (ValueError, TypeError):
+            raise InvalidCursor(token)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(token)
+        meta = self.object_list.model._meta
+        try:
+            return [
+                self._to_python(meta, name, value)
+                for name, value in zip(self.fields, values)
+            ]
+        except Exception:
+            raise InvalidCursor(token)
+
+    @staticmethod
+    def _to_python(meta, name, value):
+        try:
+            field = meta.get_field(name.split('__')[0])
+        except FieldDoesNotExist:
+            if not isinstance(value, (int, float)):
+                raise
+            return value
+        return field.to_python(value)
+
+    def keyset_filter(self, values, reverse, fields=None):
+        """
+        Условие «после ключа values» в виде
+        a <= x AND (a < x OR b < y), удобном для диапазона по индексу.
+        """
+        fields = list(zip(fields or self.fields, values, self.ordering))
+        condition = None
+        for name, value, ordering in reversed(fields):
+            lookup = 'lt' if ordering.startswith('-') != reverse else 'gt'
+            strict = Q(**{'%s__%s' % (name, lookup): value})
+            if condition is None:
+                condition = strict
+            else:
+                loose = Q(**{'%s__%se' % (name, lookup): value})
+                condition = loose & (strict | condition)
+        return condition
+
+    def order_by(self, reverse, fields=None):
+        result = []
+        for name, ordering in zip(fields or self.fields, self.ordering):
+            descending = ordering.startswith('-') != reverse
+            result.append('-' + name if descending else name)
+        return result
+
+    def fetch_from(self, queryset, values, reverse, limit):
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(values, reverse))
+        return list(queryset.order_by(*self.order_by(reverse))[:limit])
+
+    def fetch(self, values, reverse, limit):
+        """Возвращает до limit объектов, следующих за ключом values."""
+        return self.fetch_from(self.object_list, values, reverse, limit)
+
+    def fetch_offset(self, offset, limit):
+        return list(self.object_list.order_by(*self.ordering)[
+            offset:offset + limit
+        ])
+
+    def page_after(self, token=None):
+        values = self.decode_cursor(token) if token else None
+        items = self.fetch(values, False, self.per_page + 1)
+        return self.page_class(
+            items[:self.per_page], self,
+            has_next=len(items) > self.per_page,
+            has_previous=values is not None,
+        )
+
+    def page_before(self, token):
+        values = self.decode_cursor(token)
+        items = self.fetch(values, True, self.per_page + 1)
+        has_previous = len(items) > self.per_page
+        items = items[:self.per_page]
+        items.reverse()
+        return self.page_class(
+            items, self, has_next=True, has_previous=has_previous
+        )
+
+    def page_number(self, number):
+        """Поддержка старых ссылок вида ?page=N."""
+        offset = (number - 1) * self.per_page
+        items = self.fetch_offset(offset, self.per_page + 1)
+        return self.page_class(
+            items[:self.per_page], self,
+            has_next=len(items) > self.per_page,
+            has_previous=number > 1,
+        )
+
+    def get_page(self, params):
+        """
+        Возвращает страницу по GET-параметрам after/before/page.
+        Некорректные значения приводят к первой странице.
+        """
+        try:
+            if params.get('after'):
+                return self.page_after(params['after'])
+            if params.get('before'):
+                return self.page_before(params['before'])
+        except InvalidCursor:
+            return self.page_after()
+        try:
+            number = int(params.get('page') or 1)
+        except (TypeError, ValueError):
+            number = 1
+        if number > 1:
+            return self.page_number(number)
+        return self.page_after()
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Постраничный паджинатор для списков с номерами страниц (админка).
+    Число объектов кэшируется на PAGINATOR_COUNT_TIMEOUT секунд по тексту
+    SQL-запроса.
+    """
+
+    def count_key(self):
+        sql, params = self.object_list.query.sql_with_params()
+        signature = '%s|%r' % (sql, params)
+        return 'paginator_count:%s' % hashlib.md5(
+            signature.encode()
+        ).hexdigest()
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        key = self.count_key()
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+
+def paginate(request, object_list, ordering=('-pub_date', '-id')):
+    paginator = CursorPaginator(
+        object_list, settings.POSTS_PER_PAGE, ordering=ordering
+    )
+    return paginator.get_page(request.GET)
@@ -0,0 +1,112 @@
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import counters, feed, fragments, images
+from .counters import counter_changed
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(AuthorStats, instance.author_id, 'posts', 1)
+        feed.fan_out(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    counters.post_deleted(instance)
+
+
+def stored_image(instance):
+    # Без обращения к дескриптору: он создаёт FieldFile, а отложенное
+    # поле вообще не читается из базы.
+    value = instance.__dict__.get('image')
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    instance._stored_image = stored_image(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, created, raw=False,
+                     update_fields=None, **kwargs):
+    """
+    Варианты создаются только для новой картинки: правка текста поста
+    не пересобирает их заново.
+    """
+    name = stored_image(instance)
+    changed = (
+        created or name != instance._stored_image
+        if update_fields is None else 'image' in update_fields
+    )
+    instance._stored_image = name
+    if name and changed and not raw:
+        images.schedule(name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    fragments.invalidate('post', instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login, карточек он не меняет.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    fragments.invalidate('user', instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    fragments.invalidate('group', instance.pk)
+
+
+@receiver(counter_changed, sender=Post)
+def post_counter_changed(sender, pk, **kwargs):
+    fragments.invalidate('post', pk)
+
+
+@receiver(counter_changed, sender=AuthorStats)
+def stats_counter_changed(sender, pk, **kwargs):
+    fragments.invalidate('stats', pk)
+
+
+@receiver(counter_changed, sender=Comment)
+def comment_counter_changed(sender, pk, post_id, **kwargs):
+    fragments.invalidate('post', post_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    fragments.invalidate('post', instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(AuthorStats, instance.user_id, 'following', 1)
+        counters.change(AuthorStats, instance.author_id, 'followers', 1)
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """
+    Любое удаление подписки — отписка, админка или каскад от
+    пользователя — уменьшает счётчики и чистит ленту.
+    """
+    counters.change(AuthorStats, instance.user_id, 'following', -1)
+    counters.change(AuthorStats, instance.author_id, 'followers', -1)
+    feed.prune(instance.user_id, instance.author_id)
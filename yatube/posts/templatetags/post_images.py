@@ -0,0 +1,14 @@
+from django import template
+
+from ..images import picture
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(image, sizes):
+    """Картинка поста с вариантами WebP и JPEG в srcset."""
+    return {
+        'picture': picture(image.name) if image else None,
+        'sizes': sizes,
+    }
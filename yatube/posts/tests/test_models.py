@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Like, LikeComment, Post
 
 User = get_user_model()
 
@@ -63,3 +64,21 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+    def test_unique_likes_and_follows(self):
+        """Повторный лайк или подписка запрещены ограничением БД."""
+        author = User.objects.create_user(username='Author')
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Тестовый комментарий'
+        )
+        pairs = (
+            (Like, {'user': self.user, 'post': self.post}),
+            (LikeComment, {'user': self.user, 'comment': comment}),
+            (Follow, {'user': self.user, 'author': author}),
+        )
+        for model, fields in pairs:
+            with self.subTest(model=model.__name__):
+                model.objects.create(**fields)
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        model.objects.create(**fields)
@@ -0,0 +1,102 @@
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Like, Post
+
+User = get_user_model()
+LOGIN_REDIRECTS = ('posts:follow_index', 'posts:like_index')
+UNAUTHORIZED = ('api:follow_feed',)
+
+
+class QueryBudgetTest(TestCase):
+    """Страницы укладываются в бюджет запросов и не содержат N+1."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Username')
+        cls.group = Group.objects.create(
+            title='Тестовое название',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        authors = [
+            User.objects.create_user(username=f'Author{number}')
+            for number in range(3)
+        ]
+        for author in authors:
+            Follow.objects.create(user=cls.user, author=author)
+        for number in range(12):
+            post = Post.objects.create(
+                author=authors[number % 3],
+                group=cls.group,
+                text=f'Тестовый текст {number}',
+            )
+            Like.objects.create(user=cls.user, post=post)
+            for commenter in authors:
+                Comment.objects.create(
+                    post=post, author=commenter, text='Комментарий'
+                )
+        cls.post = post
+
+    def urls(self):
+        post_id = {'post_id': self.post.pk}
+        return {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ),
+            'posts:profile': reverse(
+                'posts:profile', kwargs={'username': 'Author0'}
+            ),
+            'posts:post_detail': reverse('posts:post_detail', kwargs=post_id),
+            'posts:post_comments': reverse(
+                'posts:post_comments', kwargs=post_id
+            ),
+            'posts:follow_index': reverse('posts:follow_index'),
+            'posts:like_index': reverse('posts:like_index'),
+            'posts:search': reverse('posts:search') + '?q=текст',
+            'api:posts': reverse('api:posts'),
+            'api:post_detail': reverse('api:post_detail', kwargs=post_id),
+            'api:post_comments': reverse(
+                'api:post_comments', kwargs=post_id
+            ),
+            'api:follow_feed': reverse('api:follow_feed'),
+            'api:profile': reverse(
+                'api:profile', kwargs={'username': 'Author0'}
+            ),
+        }
+
+    def test_every_budget_is_checked(self):
+        """Для каждого бюджета в настройках есть страница в тесте."""
+        self.assertEqual(set(self.urls()), set(settings.QUERY_BUDGETS))
+
+    @override_settings(QUERY_TRACE=True, QUERY_TRACE_RAISE=True)
+    def test_pages_within_budget(self):
+        """
+        Гость и пользователь с холодным кэшем укладываются в бюджет;
+        иначе промежуточный слой поднимает QueryBudgetExceeded.
+        Гостя страницы для вошедших отправляют на вход, API отвечает 401.
+        """
+        authorized_client = Client()
+        authorized_client.force_login(self.user)
+        for client in (Client(), authorized_client):
+            guest = client is not authorized_client
+            for name, url in self.urls().items():
+                with self.subTest(name=name, guest=guest):
+                    cache.clear()
+                    response = client.get(url)
+                    if guest and name in LOGIN_REDIRECTS:
+                        self.assertRedirects(
+                            response, f'{reverse("users:login")}?next={url}'
+                        )
+                    elif guest and name in UNAUTHORIZED:
+                        self.assertEqual(
+                            response.status_code, HTTPStatus.UNAUTHORIZED
+                        )
+                    else:
+                        self.assertEqual(response.status_code, HTTPStatus.OK)
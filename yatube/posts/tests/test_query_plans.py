@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Like, Post
+
+User = get_user_model()
+TABLE_PREFIX = 'posts_'
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def bad_steps(plan, sort_allowed=False):
+    """Шаги плана с полным сканированием таблицы или сортировкой."""
+    steps = []
+    for step in plan:
+        full_scan = (
+            step.startswith('SCAN ')
+            and TABLE_PREFIX in step
+            and 'USING' not in step
+        )
+        if full_scan or ('TEMP B-TREE' in step and not sort_allowed):
+            steps.append(step)
+    return steps
+
+
+class QueryPlanTest(TestCase):
+    """Планы запросов лент и страницы поста используют индексы."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Username')
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовое название',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for i in range(15):
+            post = Post.objects.create(
+                author=cls.author,
+                text='Тестовый текст',
+                group=cls.group,
+            )
+            Like.objects.create(user=cls.user, post=post)
+            Comment.objects.create(
+                post=post, author=cls.user, text='Тестовый комментарий'
+            )
+        cls.post = post
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def urls(self):
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'Author'}),
+            reverse('posts:follow_index'),
+            reverse('posts:like_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in pages:
+            yield url
+            if url != pages[-1]:
+                first = self.client.get(url).context['page_obj']
+                yield url + '?after=' + first.next_cursor
+                second = self.client.get(
+                    url + '?after=' + first.next_cursor
+                ).context['page_obj']
+                yield url + '?before=' + second.previous_cursor
+
+    def test_views_use_indexes(self):
+        """
+        Запросы страниц не сканируют таблицы целиком
+        и не сортируют во временных B-деревьях.
+        """
+        # Понравившиеся посты идут по дате поста, как остальные ленты:
+        # лайки пользователя отбираются по индексу, а сортируются
+        # только уже отобранные строки.
+        sorted_page = reverse('posts:like_index')
+        for url in self.urls():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or TABLE_PREFIX not in sql:
+                    continue
+                with self.subTest(url=url, sql=sql):
+                    self.assertEqual(bad_steps(
+                        explain(sql), url.startswith(sorted_page)
+                    ), [])
@@ -1,13 +1,28 @@
+import gzip
+import json
 import shutil
 import tempfile
+from concurrent.futures import Future
+from io import BytesIO, StringIO
+from unittest import mock
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 from django.conf import settings
 from django import forms
-from ..models import Group, Post, Comment, Follow
+from PIL import Image
+from .. import counters, feed, fragments, fulltext, images
+from ..paginators import CachedCountPaginator
+from ..models import (AuthorStats, Group, Post, Comment, Follow, FeedEntry,
+                      FeedPullAuthor,
+                      Like, LikeComment)
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -187,6 +202,123 @@ class PostPagesTests(TestCase):
                 form_field = response.context['form'].fields[value]
                 self.assertIsInstance(form_field, expected)
 
+    def test_picture_variants(self):
+        """
+        Страница поста отдаёт srcset из вариантов WebP и JPEG,
+        созданных заранее.
+        """
+        name = self.post.image.name
+        images.generate(name)
+        with mock.patch.object(images, 'render') as render:
+            response = self.authorized_client.get(
+                reverse('posts:post_detail', kwargs={'post_id': '1'})
+            )
+        render.assert_not_called()
+        self.assertContains(response, 'posts/small_2w.webp 2w')
+        self.assertContains(response, 'posts/small_2w.jpg 2w')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_variants_strip_exif(self):
+        """
+        Оригинал и варианты сохраняются без EXIF,
+        ширины не превышают ширину оригинала.
+        """
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        Image.new('RGB', (800, 600), 'red').save(
+            buffer, format='JPEG', exif=exif
+        )
+        post = Post.objects.create(
+            author=self.user,
+            text='Тестовый текст',
+            image=SimpleUploadedFile('photo.jpg', buffer.getvalue()),
+        )
+        meta = images.generate(post.image.name)
+        self.assertEqual(meta['widths'], [320, 640, 800])
+        for path in (
+            post.image.path,
+            post.image.path.replace('.jpg', '_320w.webp'),
+            post.image.path.replace('.jpg', '_800w.jpg'),
+        ):
+            with self.subTest(path=path), Image.open(path) as image:
+                self.assertFalse(image.getexif())
+
+    def test_picture_without_variants(self):
+        """Пока вариантов нет, страница отдаёт оригинал без рендеринга."""
+        with mock.patch.object(images, 'render') as render:
+            response = self.authorized_client.get(
+                reverse('posts:post_detail', kwargs={'post_id': '1'})
+            )
+        render.assert_not_called()
+        self.assertContains(
+            response, f'<img class="card-img my-2" src="{self.post.image.url}"'
+        )
+        self.assertNotContains(response, 'srcset')
+
+    def test_variants_scheduled_for_new_image_only(self):
+        """Варианты пересобираются при замене картинки, но не текста."""
+        self.uploaded.seek(0)
+        content = self.uploaded.read()
+        with mock.patch.object(images, 'schedule') as schedule:
+            post = Post.objects.create(
+                author=self.user,
+                text='Тестовый текст',
+                image=SimpleUploadedFile('first.gif', content),
+            )
+            schedule.assert_called_once_with(post.image.name)
+            schedule.reset_mock()
+            post = Post.objects.get(pk=post.pk)
+            post.text = 'Новый текст'
+            post.save()
+            post.save(update_fields=['text'])
+            schedule.assert_not_called()
+            post.image = SimpleUploadedFile('second.gif', content)
+            post.save()
+            schedule.assert_called_once_with(post.image.name)
+
+    def test_failed_variants_are_logged(self):
+        """Ошибка создания вариантов в пуле попадает в журнал."""
+        future = Future()
+        future.set_exception(OSError('Диск заполнен'))
+        pool = mock.Mock()
+        pool.submit.return_value = future
+        run_now = mock.patch.object(
+            images.transaction, 'on_commit', lambda func: func()
+        )
+        with mock.patch.object(images, 'executor', return_value=pool), \
+                run_now, self.assertLogs('posts.images', 'ERROR') as logs:
+            images.schedule(self.post.image.name)
+        self.assertIn(self.post.image.name, logs.output[0])
+        self.assertIn('Диск заполнен', logs.output[0])
+        self.assertFalse(images.is_ready(self.post.image.name))
+
+    def test_variants_keep_alpha(self):
+        """Прозрачность PNG сохраняется в WebP, JPEG получает фон."""
+        buffer = BytesIO()
+        Image.new('RGBA', (400, 300), (255, 0, 0, 0)).save(
+            buffer, format='PNG'
+        )
+        post = Post.objects.create(
+            author=self.user,
+            text='Тестовый текст',
+            image=SimpleUploadedFile('alpha.png', buffer.getvalue()),
+        )
+        images.generate(post.image.name)
+        webp = post.image.path.replace('.png', '_320w.webp')
+        with Image.open(webp) as image:
+            self.assertEqual(image.mode, 'RGBA')
+            self.assertEqual(image.getpixel((0, 0))[3], 0)
+        jpeg = post.image.path.replace('.png', '_320w.jpg')
+        with Image.open(jpeg) as image:
+            self.assertEqual(image.getpixel((0, 0)), (255, 255, 255))
+
+    def test_generate_image_variants_command(self):
+        """Команда generate_image_variants обрабатывает картинки постов."""
+        out = StringIO()
+        call_command('generate_image_variants', workers=1, stdout=out)
+        self.assertIn('Обработано картинок: 1', out.getvalue())
+
 
 class PaginatorViewsTest(TestCase):
     """Тест паджинатора."""
@@ -247,6 +379,60 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(post_text_1, 'Тестовый текст')
                 self.assertEqual(str(post_group_1), 'Тестовое название')
 
+    def test_cursor_pages(self):
+        """Переход по курсорам after/before возвращает соседние страницы."""
+        for url, kwarg in self.urls.items():
+            with self.subTest(url=url):
+                address = reverse(url, kwargs=kwarg)
+                first = self.client.get(address).context['page_obj']
+                self.assertFalse(first.has_previous())
+                second = self.client.get(
+                    address + '?after=' + first.next_cursor
+                ).context['page_obj']
+                self.assertEqual(len(second), 3)
+                self.assertFalse(second.has_next())
+                self.assertTrue(set(first).isdisjoint(second))
+                back = self.client.get(
+                    address + '?before=' + second.previous_cursor
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Некорректный курсор открывает первую страницу."""
+        response = self.client.get(reverse('posts:index') + '?after=bad')
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_no_count_query(self):
+        """Страница ленты не выполняет COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index') + '?page=2')
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries)
+        )
+
+    def test_cached_count_paginator(self):
+        """Число объектов считается один раз и кэшируется."""
+        post_list = Post.objects.filter(group=self.group).order_by('-id')
+        self.assertEqual(CachedCountPaginator(post_list, 5).num_pages, 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(post_list, 5).count, 13)
+
+    def test_admin_uses_cached_count(self):
+        """Список постов в админке не пересчитывает COUNT повторно."""
+        admin = User.objects.create_superuser(
+            username='Admin', email='admin@example.com', password='pass'
+        )
+        client = Client()
+        client.force_login(admin)
+        url = reverse('admin:posts_post_changelist')
+        client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.context['cl'].result_count, 13)
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']]
+        )
+
 
 class CommentsViewsTest(TestCase):
     """Тест комментариев."""
@@ -311,6 +497,73 @@ class CommentsViewsTest(TestCase):
         )
         self.assertEqual(Comment.objects.count(), comment_count)
 
+    def test_post_detail_constant_queries(self):
+        """
+        Число запросов страницы поста
+        не зависит от числа комментариев.
+        """
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.authorized_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        author = User.objects.create_user(username='Commentator')
+        for _ in range(10):
+            comment = Comment.objects.create(
+                post=self.post, author=author, text='Комментарий'
+            )
+        LikeComment.objects.create(user=self.user, comment=comment)
+        with self.assertNumQueries(len(queries)):
+            response = self.authorized_client.get(url)
+        self.assertEqual(len(response.context['comments']), 11)
+        self.assertEqual(
+            sum(comment.is_liked for comment in response.context['comments']),
+            1
+        )
+
+    @override_settings(COMMENTS_PER_PAGE=5)
+    def test_comments_loaded_by_cursor(self):
+        """
+        Страница поста показывает первые комментарии,
+        остальные отдаются фрагментами по курсору.
+        """
+        for i in range(7):
+            comment = Comment.objects.create(
+                post=self.post, author=self.user, text=f'Комментарий {i}'
+            )
+        LikeComment.objects.create(user=self.user, comment=self.comment)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        first = response.context['comments']
+        self.assertEqual(first[0], comment)
+        self.assertEqual(len(first), 5)
+        self.assertContains(response, 'comments-more')
+        response = self.authorized_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'after': first.next_cursor}
+        )
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 3)
+        self.assertEqual(rest[-1], self.comment)
+        self.assertTrue(rest[-1].is_liked)
+        self.assertNotContains(response, 'comments-more')
+
+    @override_settings(COMMENTS_PER_PAGE=5)
+    def test_more_comments_without_js(self):
+        """Ссылка «Показать ещё» ведёт на полную страницу поста."""
+        for i in range(7):
+            Comment.objects.create(
+                post=self.post, author=self.user, text=f'Комментарий {i}'
+            )
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = self.authorized_client.get(url)
+        cursor = response.context['comments'].next_cursor
+        self.assertContains(response, f'href="{url}?after={cursor}"')
+        response = self.authorized_client.get(url, {'after': cursor})
+        self.assertTemplateUsed(response, 'posts/post_detail.html')
+        self.assertEqual(len(response.context['comments']), 3)
+        self.assertEqual(response.context['post'], self.post)
+
 
 class CacheTest(TestCase):
     """Тест кэша."""
@@ -344,6 +597,32 @@ class CacheTest(TestCase):
         self.assertIn('Тестовый текст', old_content)
         self.assertNotIn('Тестовый текст', new_content)
 
+    def test_post_card_fragment_cache(self):
+        """Карточка поста берётся из кэша до смены версии поста."""
+        post = Post.objects.get(text='Тестовый текст')
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=post.pk).update(text='Новый текст')
+        content = self.guest_client.get(reverse('posts:index')).content
+        self.assertIn('Тестовый текст', content.decode('UTF-8'))
+        counters.toggle_post_like(self.user, post.pk)
+        content = self.guest_client.get(reverse('posts:index')).content
+        self.assertIn('Новый текст', content.decode('UTF-8'))
+
+    def test_author_rename_invalidates_card(self):
+        """Смена имени автора обновляет его карточки."""
+        self.guest_client.get(reverse('posts:index'))
+        self.user.first_name = 'Переименованный'
+        self.user.save()
+        content = self.guest_client.get(reverse('posts:index')).content
+        self.assertIn('Переименованный', content.decode('UTF-8'))
+
+    def test_login_keeps_author_cards(self):
+        """Вход автора не сбрасывает версию его карточек."""
+        key = fragments.version_key('user', self.user.pk)
+        before = fragments.current_versions([key], {})
+        self.guest_client.force_login(self.user)
+        self.assertEqual(fragments.current_versions([key], {}), before)
+
 
 class FollowTest(TestCase):
     """Тест подписок."""
@@ -489,3 +768,830 @@ class FollowTest(TestCase):
         )
         context = response.context['following']
         self.assertFalse(context)
+
+    def test_unfollow_removes_posts_from_feed(self):
+        """После отписки посты автора пропадают из ленты."""
+        self.authorized_client2.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': 'User_author'}
+            )
+        )
+        response = self.authorized_client2.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(len(response.context['page_obj']), 0)
+        self.assertFalse(FeedEntry.objects.filter(user=self.user2).exists())
+
+    def stats(self):
+        return (
+            AuthorStats.objects.get(user=self.user2).following,
+            AuthorStats.objects.get(user=self.author).followers,
+        )
+
+    def test_unfollow_counts_once(self):
+        """Отписка уменьшает счётчики ровно на единицу."""
+        self.assertEqual(self.stats(), (1, 1))
+        feed.unfollow(self.user2.pk, self.author.pk)
+        self.assertEqual(self.stats(), (0, 0))
+
+    def test_admin_delete_updates_stats_and_feed(self):
+        """Удаление подписки в админке чистит ленту и счётчики."""
+        admin = User.objects.create_superuser(
+            username='Admin', email='admin@example.com', password='pass'
+        )
+        client = Client()
+        client.force_login(admin)
+        client.post(reverse('admin:posts_follow_changelist'), {
+            'action': 'delete_selected',
+            '_selected_action': [self.follow.pk],
+            'post': 'yes',
+        })
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.stats(), (0, 0))
+        self.assertFalse(FeedEntry.objects.filter(user=self.user2).exists())
+
+    def test_cascade_delete_updates_stats(self):
+        """Удаление подписчика уменьшает число подписчиков автора."""
+        follower = User.objects.create_user(username='Follower')
+        feed.follow(follower.pk, self.author.pk)
+        self.assertEqual(self.stats(), (1, 2))
+        follower.delete()
+        self.assertEqual(self.stats(), (1, 1))
+
+    @override_settings(FEED_MAX_ENTRIES=2, FEED_TRIM_SLACK=0)
+    def test_feed_is_capped(self):
+        """Длинная лента подрезается при чтении, а не при рассылке."""
+        for i in range(2):
+            Post.objects.create(author=self.author, text='Тестовый текст')
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user2).count(), 3
+        )
+        self.authorized_client2.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user2).count(), 2
+        )
+
+    def test_maintain_feeds(self):
+        """Команда снимает пометку с автора и возвращает его в рассылку."""
+        with override_settings(FEED_FANOUT_LIMIT=0):
+            post2 = Post.objects.create(
+                author=self.author, text='Тестовый текст 2'
+            )
+        self.assertTrue(
+            FeedPullAuthor.objects.filter(author=self.author).exists()
+        )
+        out = StringIO()
+        call_command('maintain_feeds', stdout=out)
+        self.assertIn('Авторов снова в рассылке: 1', out.getvalue())
+        self.assertFalse(FeedPullAuthor.objects.exists())
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user2, post=post2).exists()
+        )
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_busy_author_pull_path(self):
+        """Посты популярного автора подмешиваются в ленту при чтении."""
+        post2 = Post.objects.create(
+            author=self.author,
+            text='Тестовый текст 2',
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=post2).exists())
+        response = self.authorized_client2.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), [post2, self.post1]
+        )
+
+
+class CountersTest(TestCase):
+    """Тест счётчиков лайков и комментариев."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Username')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый текст',
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.post,
+            author=cls.user,
+            text='Тестовый комментарий'
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_post_like_toggle(self):
+        """Лайк поста ставится и снимается, счётчик следует за ним."""
+        url = reverse('posts:post_like', kwargs={'post_id': self.post.id})
+        referer = reverse('posts:index')
+        self.authorized_client.get(url, HTTP_REFERER=referer)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+        self.authorized_client.get(url, HTTP_REFERER=referer)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        self.assertFalse(Like.objects.filter(post=self.post).exists())
+
+    def test_comment_like_toggle(self):
+        """Лайк комментария ставится и снимается."""
+        url = reverse(
+            'posts:like_comment',
+            kwargs={'post_id': self.post.id, 'com_id': self.comment.id}
+        )
+        self.authorized_client.get(url)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.like, 1)
+        self.authorized_client.get(url)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.like, 0)
+
+    def test_comment_like_resets_post_card(self):
+        """Лайк комментария сбрасывает карточку поста без лишних запросов."""
+        key = fragments.version_key('post', self.post.pk)
+        before = cache.get(key)
+        with CaptureQueriesContext(connection) as queries:
+            counters.toggle_comment_like(
+                self.user, self.comment.pk, self.post.pk
+            )
+        self.assertNotEqual(cache.get(key), before)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "posts_comment"."post_id"')
+        ])
+
+    def test_liked_posts_by_pub_date(self):
+        """Понравившиеся посты идут по дате публикации, а не лайка."""
+        newer = Post.objects.create(author=self.user, text='Новый пост')
+        counters.toggle_post_like(self.user, newer.pk)
+        counters.toggle_post_like(self.user, self.post.pk)
+        response = self.authorized_client.get(reverse('posts:like_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [newer, self.post]
+        )
+
+    def test_comment_counter(self):
+        """Добавление и удаление комментария меняет счётчик поста."""
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Тестовый комментарий 2'}
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        comment = Comment.objects.get(text='Тестовый комментарий 2')
+        self.authorized_client.get(
+            reverse(
+                'posts:delete_comment',
+                kwargs={'post_id': self.post.id, 'com_id': comment.id}
+            )
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_comment_deleted_twice(self):
+        """Повторное удаление комментария не уменьшает счётчик."""
+        for text in ('Первый', 'Второй'):
+            counters.add_comment(
+                Comment(post=self.post, author=self.user, text=text)
+            )
+        comment = Comment.objects.get(text='Первый')
+        counters.delete_comment(comment)
+        counters.delete_comment(comment)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_ajax_actions_return_json(self):
+        """Запросы из скрипта получают JSON вместо редиректа."""
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        response = self.authorized_client.get(
+            reverse('posts:post_like', kwargs={'post_id': self.post.id}),
+            **ajax
+        )
+        self.assertEqual(response.json(), {'liked': True, 'likes_count': 1})
+        response = self.authorized_client.get(
+            reverse(
+                'posts:like_comment',
+                kwargs={'post_id': self.post.id, 'com_id': self.comment.id}
+            ),
+            **ajax
+        )
+        self.assertEqual(response.json(), {'liked': True, 'likes_count': 1})
+        author = User.objects.create_user(username='Author')
+        response = self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'Author'}),
+            **ajax
+        )
+        self.assertEqual(
+            response.json(), {'following': True, 'followers_count': 1}
+        )
+        response = self.authorized_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'Author'}),
+            **ajax
+        )
+        self.assertEqual(
+            response.json(), {'following': False, 'followers_count': 0}
+        )
+        self.assertFalse(Follow.objects.filter(author=author).exists())
+
+    def test_ajax_add_comment(self):
+        """Новый комментарий возвращается фрагментом разметки."""
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.id})
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        response = self.authorized_client.post(
+            url, data={'text': 'Комментарий из скрипта'}, **ajax
+        )
+        data = response.json()
+        self.assertIn('Комментарий из скрипта', data['html'])
+        self.assertEqual(data['comments_count'], 1)
+        response = self.authorized_client.post(url, data={'text': ''}, **ajax)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+    def test_reconcile_counters(self):
+        """Команда reconcile_counters восстанавливает разошедшиеся счётчики."""
+        Like.objects.create(user=self.user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(
+            likes_count=5, comments_count=0
+        )
+        call_command('reconcile_counters', chunk_size=1, stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.post.comments_count, 1)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_author_stats_follow_write_paths(self):
+        """Статистика авторов следует за постами, подписками и лайками."""
+        reader = User.objects.create_user(username='Reader')
+        client = Client()
+        client.force_login(reader)
+        client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'Username'}
+        ))
+        client.get(
+            reverse('posts:post_like', kwargs={'post_id': self.post.id}),
+            HTTP_REFERER=reverse('posts:index')
+        )
+        post = Post.objects.create(author=self.user, text='Тестовый текст')
+        author, reader = self.stats(self.user), self.stats(reader)
+        self.assertEqual(
+            (author.posts, author.followers, author.likes_received), (2, 1, 1)
+        )
+        self.assertEqual((reader.following, reader.likes_given), (1, 1))
+        client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'Username'}
+        ))
+        post.delete()
+        Post.objects.get(pk=self.post.pk).delete()
+        author.refresh_from_db()
+        reader.refresh_from_db()
+        self.assertEqual(
+            (author.posts, author.followers, author.likes_received), (0, 0, 0)
+        )
+        self.assertEqual((reader.following, reader.likes_given), (0, 0))
+
+    def test_profile_reads_stats(self):
+        """Профиль берёт число постов из статистики, не считая их."""
+        AuthorStats.objects.filter(user=self.user).update(posts=42)
+        response = self.authorized_client.get(
+            reverse('posts:profile', kwargs={'username': 'Username'})
+        )
+        self.assertEqual(response.context['posts_count'], 42)
+
+    def test_pages_without_stats_row(self):
+        """Без строки AuthorStats профиль, пост и API отдают нули."""
+        AuthorStats.objects.filter(user=self.user).delete()
+        for url in (
+            reverse('posts:profile', kwargs={'username': 'Username'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('api:profile', kwargs={'username': 'Username'}),
+        ):
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['posts_count'], 0)
+
+    def test_counter_does_not_go_below_zero(self):
+        """Вычитание из заниженного счётчика останавливается на нуле."""
+        reader = User.objects.create_user(username='Reader')
+        Follow.objects.create(user=reader, author=self.user)
+        AuthorStats.objects.filter(user=self.user).update(followers=0)
+        feed.unfollow(reader.pk, self.user.pk)
+        self.assertEqual(self.stats(self.user).followers, 0)
+        post = Post.objects.create(author=self.user, text='Текст')
+        counters.toggle_post_like(reader, post.pk)
+        AuthorStats.objects.filter(user=reader).update(likes_given=0)
+        post.delete()
+        self.assertEqual(self.stats(reader).likes_given, 0)
+
+    def test_post_delete_resets_likers_stats(self):
+        """Удаление поста сбрасывает версии статистики всех лайкнувших."""
+        post = Post.objects.create(author=self.user, text='Текст')
+        readers = [
+            User.objects.create_user(username=f'Reader{number}')
+            for number in range(3)
+        ]
+        for reader in readers:
+            counters.toggle_post_like(reader, post.pk)
+        keys = [fragments.version_key('stats', user.pk) for user in readers]
+        before = cache.get_many(keys)
+        with mock.patch.object(
+            fragments, 'bump', wraps=fragments.bump
+        ) as bump:
+            post.delete()
+        after = cache.get_many(keys)
+        for key in keys:
+            self.assertNotEqual(before.get(key), after.get(key))
+        self.assertEqual(
+            {call.args for call in bump.call_args_list
+             if call.args[0] == 'stats'},
+            {('stats', self.user.pk)}
+        )
+
+    def test_reconcile_author_stats(self):
+        """reconcile_counters исправляет статистику и создаёт недостающую."""
+        AuthorStats.objects.filter(user=self.user).update(posts=42)
+        reader = User.objects.create_user(username='Reader')
+        Follow.objects.create(user=reader, author=self.user)
+        AuthorStats.objects.filter(user=reader).delete()
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Создано строк статистики: 1', out.getvalue())
+        self.assertIn('posts.AuthorStats.posts: расхождений 1', out.getvalue())
+        self.assertEqual(self.stats(self.user).posts, 1)
+        self.assertEqual(self.stats(reader).following, 1)
+
+
+class ConditionalGetTest(TestCase):
+    """Тест условных GET-запросов."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Username')
+        cls.group = Group.objects.create(
+            title='Тестовое название',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый текст',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'Username'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_not_modified(self):
+        """Совпадающий ETag даёт 304 без основных запросов."""
+        for url in self.urls():
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(len(queries), 1)
+
+    def test_no_last_modified(self):
+        """Last-Modified не отдаётся, If-Modified-Since не даёт 304."""
+        url = reverse('posts:index')
+        response = self.guest_client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_unrelated_changes_keep_etag(self):
+        """Изменения вне страницы группы не меняют её ETag."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        etag = self.guest_client.get(url)['ETag']
+        other = User.objects.create_user(username='Other')
+        other_post = Post.objects.create(author=other, text='Другой пост')
+        counters.toggle_post_like(other, other_post.pk)
+        self.client.force_login(other)
+        self.assertEqual(self.guest_client.get(url)['ETag'], etag)
+
+    def test_changes_reset_etag(self):
+        """Лайк, правка поста и вход пользователя меняют ETag."""
+        url = reverse('posts:index')
+        etags = {self.guest_client.get(url)['ETag']}
+        counters.toggle_post_like(self.user, self.post.pk)
+        etags.add(self.guest_client.get(url)['ETag'])
+        self.post.text = 'Новый текст'
+        self.post.save()
+        etags.add(self.guest_client.get(url)['ETag'])
+        self.guest_client.force_login(self.user)
+        etags.add(self.guest_client.get(url)['ETag'])
+        self.assertEqual(len(etags), 4)
+
+
+class SearchTest(TestCase):
+    """Тест полнотекстового поиска."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='Username', is_staff=True, is_superuser=True
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Рецепт борща со сметаной',
+        )
+        cls.commented = Post.objects.create(
+            author=cls.user,
+            text='Фотография с дачи',
+        )
+        Comment.objects.create(
+            post=cls.commented,
+            author=cls.user,
+            text='Борщ тоже был хорош',
+        )
+        for i in range(12):
+            Post.objects.create(author=cls.user, text=f'Заметка номер {i}')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response, list(response.context['page_obj'] or [])
+
+    def test_search_posts_and_comments(self):
+        """Поиск находит посты по тексту и комментариям, пост выше."""
+        _, posts = self.search('БОРЩ')
+        self.assertEqual(posts, [self.post, self.commented])
+        _, posts = self.search('сметан')
+        self.assertEqual(posts, [self.post])
+
+    def test_search_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Рецепт окрошки'
+        post.save()
+        _, posts = self.search('окрошка окрошки')
+        self.assertEqual(posts, [])
+        _, posts = self.search('окрошки')
+        self.assertEqual(posts, [post])
+        post.delete()
+        _, posts = self.search('окрошки')
+        self.assertEqual(posts, [])
+
+    def test_search_pagination_keeps_query(self):
+        """Курсорные ссылки выдачи сохраняют поисковый запрос."""
+        response, first = self.search('заметка')
+        page_obj = response.context['page_obj']
+        self.assertContains(
+            response, f'?q=%D0%B7%D0%B0%D0%BC%D0%B5%D1%82%D0%BA%D0%B0&amp;'
+            f'after={page_obj.next_cursor}'
+        )
+        _, second = self.search('заметка', after=page_obj.next_cursor)
+        self.assertEqual(len(first) + len(second), 12)
+        self.assertFalse(set(first) & set(second))
+
+    def test_bad_query(self):
+        """Спецсимволы FTS5 в запросе не приводят к ошибке."""
+        response, posts = self.search('"борщ* (')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(posts, [self.post, self.commented])
+
+    def test_admin_search(self):
+        """Поиск в админке находит посты по тексту и комментариям."""
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'борщ'}
+        )
+        self.assertCountEqual(
+            response.context['cl'].result_list, [self.post, self.commented]
+        )
+
+    def test_rebuild_search_index(self):
+        """Команда rebuild_search_index восстанавливает индекс."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO posts_post_fts (posts_post_fts) "
+                "VALUES ('delete-all')"
+            )
+        self.assertEqual(self.search('сметан')[1], [])
+        out = StringIO()
+        call_command('rebuild_search_index', chunk_size=5, stdout=out)
+        self.assertIn('Проиндексировано записей: 15', out.getvalue())
+        self.assertEqual(self.search('сметан')[1], [self.post])
+        post = Post.objects.create(author=self.user, text='Свежая сметана')
+        self.assertEqual(self.search('сметан')[1], [post, self.post])
+
+    def test_rebuild_indexes_concurrent_insert_once(self):
+        """Пост, созданный во время переиндексации, попадает в индекс."""
+        index_chunks = fulltext.index_chunks
+        created = []
+
+        def insert_during_rebuild(using, table, fts, chunk_size):
+            result = index_chunks(using, table, fts, chunk_size)
+            if not created:
+                created.append(
+                    Post.objects.create(author=self.user, text='Окрошка')
+                )
+            return result
+
+        with mock.patch.object(
+            fulltext, 'index_chunks', side_effect=insert_during_rebuild
+        ):
+            total = fulltext.rebuild(chunk_size=5)
+        self.assertEqual(total, 16)
+        self.assertEqual(self.search('окрошк')[1], created)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM posts_post_fts_docsize WHERE id = %s',
+                [created[0].pk]
+            )
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class ViewerStateTest(TestCase):
+    """Тест отметок текущего пользователя в карточках ленты."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Username')
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовое название',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.liked = Post.objects.create(
+            author=cls.user, text='Тестовый текст', group=cls.group
+        )
+        cls.followed = Post.objects.create(
+            author=cls.author, text='Тестовый текст', group=cls.group
+        )
+        Like.objects.create(user=cls.user, post=cls.liked)
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_feeds_attach_viewer_state(self):
+        """Ленты проставляют постам is_liked и is_following."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'Author'}),
+            reverse('posts:follow_index'),
+            reverse('posts:like_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                page_obj = self.authorized_client.get(url).context['page_obj']
+                for post in page_obj:
+                    self.assertEqual(post.is_liked, post == self.liked)
+                    self.assertEqual(
+                        post.is_following, post.author == self.author
+                    )
+
+    def test_viewer_state_queries_do_not_grow(self):
+        """Состояние зрителя загружается постоянным числом запросов."""
+        url = reverse('posts:index')
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        for _ in range(5):
+            Post.objects.create(author=self.author, text='Тестовый текст')
+        cache.clear()
+        with self.assertNumQueries(len(queries)):
+            self.authorized_client.get(url)
+
+    def test_card_cache_varies_by_viewer(self):
+        """Закэшированная карточка не переносит отметки на другого зрителя."""
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        content = self.guest_client.get(url).content.decode()
+        self.assertNotIn('<img src="/static/img/liked.png"', content)
+        self.assertNotIn('вы подписаны', content)
+        content = self.authorized_client.get(url).content.decode()
+        self.assertIn('<img src="/static/img/liked.png"', content)
+        self.assertIn('вы подписаны', content)
+
+
+class ImportTest(TestCase):
+    """Тест команды import_yatube."""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        with open(f'{self.directory}/{name}', 'w', encoding='utf-8') as file:
+            file.write(content)
+
+    def test_import_rebuilds_counters_and_feed(self):
+        """Загрузка сохраняет ключи и даты и пересчитывает счётчики."""
+        self.write('users.csv', (
+            'id,username,first_name\n'
+            '101,writer,Писатель\n'
+            '102,reader,Читатель\n'
+        ))
+        self.write('groups.ndjson', (
+            '{"id": 7, "title": "Группа", "slug": "imported"}\n'
+        ))
+        self.write('posts.ndjson', '\n'.join(
+            '{"id": %d, "author": 101, "group": 7, "text": "Пост %d", '
+            '"pub_date": "2020-01-%02dT10:00:00"}' % (pk, pk, pk)
+            for pk in range(1, 6)
+        ))
+        self.write('comments.csv', (
+            'id,post,author,text,created\n'
+            '1,5,102,Комментарий,2020-02-01T10:00:00\n'
+        ))
+        self.write('follows.csv', 'user,author\n102,101\n102,101\n')
+        self.write('likes.ndjson', '{"user": 102, "post": 5}\n')
+        out = StringIO()
+        call_command('import_yatube', self.directory, chunk_size=2, stdout=out)
+        self.assertIn('Загружено строк: 12', out.getvalue())
+        self.assertIn('из них уже были в базе: 1', out.getvalue())
+        post = Post.objects.get(pk=5)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual((post.likes_count, post.comments_count), (1, 1))
+        self.assertEqual(post.group.slug, 'imported')
+        writer = AuthorStats.objects.get(pk=101)
+        self.assertEqual(
+            (writer.posts, writer.followers, writer.likes_received),
+            (5, 1, 1)
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(user_id=102).count(), 5
+        )
+        self.assertFalse(User.objects.get(pk=102).has_usable_password())
+        self.assertEqual(
+            Post.objects.create(author_id=101, text='Новый').pk, 6
+        )
+
+    def test_import_expires_card_versions(self):
+        """После загрузки версии затронутых постов и авторов сброшены."""
+        writer = User.objects.create_user(username='writer')
+        post = Post.objects.create(author=writer, text='Старый пост')
+        keys = [
+            fragments.version_key('post', post.pk),
+            fragments.version_key('stats', writer.pk),
+        ]
+        before = fragments.current_versions(keys, {})
+        self.write('likes.csv', f'user,post\n{writer.pk},{post.pk}\n')
+        call_command('import_yatube', self.directory, stdout=StringIO())
+        after = fragments.current_versions(keys, {})
+        self.assertNotEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+
+    def test_import_skips_existing_rows(self):
+        """Повторная загрузка пропускает строки, которые уже есть."""
+        self.write('users.csv', 'id,username\n101,writer\n102,reader\n')
+        self.write('follows.csv', 'user,author\n102,101\n')
+        call_command('import_yatube', self.directory, stdout=StringIO())
+        self.write('users.csv', (
+            'id,username\n101,writer\n102,reader\n103,other\n'
+        ))
+        out = StringIO()
+        call_command('import_yatube', self.directory, stdout=out)
+        self.assertIn('из них уже были в базе: 3', out.getvalue())
+        self.assertEqual(User.objects.get(pk=103).username, 'other')
+        self.assertEqual(AuthorStats.objects.get(pk=101).followers, 1)
+
+    def test_import_reports_conflicting_rows(self):
+        """Строка, нарушающая ограничение, не пропускается молча."""
+        User.objects.create_user(username='writer')
+        self.write('users.csv', 'id,username\n101,writer\n')
+        with self.assertRaisesMessage(CommandError, 'users'):
+            call_command('import_yatube', self.directory, stdout=StringIO())
+        self.assertFalse(User.objects.filter(pk=101).exists())
+
+    def test_import_reports_bad_rows(self):
+        """Строка без обязательного поля останавливает загрузку."""
+        self.write('users.ndjson', '{"id": 1}\n')
+        with self.assertRaisesMessage(CommandError, 'users'):
+            call_command('import_yatube', self.directory, stdout=StringIO())
+
+    def test_seed_bench_is_reproducible(self):
+        """Одинаковое зерно даёт одинаковые данные."""
+        options = {
+            'users': 10, 'groups': 2, 'posts': 30, 'comments': 10,
+            'follows': 20, 'likes': 20, 'stdout': StringIO(),
+        }
+
+        def snapshot():
+            return list(Post.objects.order_by('pk').values_list(
+                'text', 'likes_count', 'comments_count'
+            ))
+
+        call_command('seed_bench', **options)
+        first = snapshot()
+        self.assertEqual(len(first), 30)
+        self.assertEqual(
+            sum(post[1] for post in first), Like.objects.count()
+        )
+        Post.objects.all().delete()
+        User.objects.all().delete()
+        call_command('seed_bench', **options)
+        self.assertEqual(snapshot(), first)
+
+
+class ImportForeignKeyTest(TransactionTestCase):
+    """Загрузка вне тестовой транзакции: ключи проверяются при коммите."""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_missing_author_is_reported(self):
+        """Ссылка на несуществующего автора — ошибка загрузки."""
+        with open(f'{self.directory}/posts.ndjson', 'w') as file:
+            file.write('{"id": 1, "author": 999, "text": "Сирота"}\n')
+        with self.assertRaisesMessage(CommandError, 'posts'):
+            call_command('import_yatube', self.directory, stdout=StringIO())
+        self.assertFalse(Post.objects.exists())
+
+
+class ExportTest(TestCase):
+    """Тест потоковой выгрузки."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Username')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+            for number in range(3)
+        ]
+        Like.objects.create(user=cls.reader, post=cls.posts[0])
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def read(self, kind):
+        with gzip.open(f'{self.directory}/{kind}.ndjson.gz', 'rt') as file:
+            return [json.loads(line) for line in file]
+
+    def test_export_command_incremental(self):
+        """Повторная выгрузка с файлом состояния отдаёт только новые строки."""
+        state = f'{self.directory}/state.json'
+        call_command(
+            'export_yatube', self.directory, state=state, chunk_size=2,
+            stdout=StringIO()
+        )
+        posts = self.read('posts')
+        self.assertEqual(
+            [post['id'] for post in posts],
+            [post.pk for post in self.posts]
+        )
+        self.assertEqual(posts[0]['author'], self.user.pk)
+        self.assertEqual(self.read('likes')[0]['post'], self.posts[0].pk)
+        self.assertEqual(len(self.read('follows')), 1)
+        new_post = Post.objects.create(author=self.user, text='Новый')
+        call_command(
+            'export_yatube', self.directory, state=state, kinds=['posts'],
+            stdout=StringIO()
+        )
+        self.assertEqual(
+            [post['id'] for post in self.read('posts')], [new_post.pk]
+        )
+
+    def test_export_view_staff_only(self):
+        """Выгрузка по HTTP доступна только персоналу."""
+        url = reverse('posts:export', kwargs={'kind': 'posts'})
+        client = Client()
+        client.force_login(self.reader)
+        self.assertEqual(client.get(url).status_code, 302)
+        staff = User.objects.create_user(username='Staff', is_staff=True)
+        client.force_login(staff)
+        response = client.get(url, {'after': self.posts[0].pk})
+        self.assertTrue(response.streaming)
+        lines = gzip.decompress(
+            b''.join(response.streaming_content)
+        ).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)['id'] for line in lines],
+            [post.pk for post in self.posts[1:]]
+        )
+        response = client.get(url, {'since': 'вчера'})
+        self.assertEqual(response.status_code, 400)
@@ -11,6 +11,11 @@ urlpatterns = [
     path('profile/<str:username>/', views.profile, name='profile'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/', views.post_view, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path(
         'posts/<int:post_id>/delete/',
@@ -44,6 +49,8 @@ urlpatterns = [
         name="profile_unfollow"
     ),
     path('likes/', views.like_index, name='like_index'),
+    path('search/', views.search, name='search'),
+    path('export/<str:kind>/', views.export, name='export'),
     path(
         'posts/<int:post_id>/post_like/',
         views.post_like,
@@ -0,0 +1,25 @@
+"""
+Состояние текущего пользователя для карточек ленты.
+
+Лайки и подписки для всех постов страницы загружаются двумя запросами
+и проставляются постам как is_liked и is_following.
+"""
+from .models import Follow, Like
+
+
+def attach(user, posts):
+    posts = list(posts)
+    liked = following = set()
+    if user.is_authenticated and posts:
+        liked = set(Like.objects.filter(
+            user=user,
+            post__in={post.pk for post in posts},
+        ).values_list('post_id', flat=True))
+        following = set(Follow.objects.filter(
+            user=user,
+            author__in={post.author_id for post in posts},
+        ).values_list('author_id', flat=True))
+    for post in posts:
+        post.is_liked = post.pk in liked
+        post.is_following = post.author_id in following
+    return posts
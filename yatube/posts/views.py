@@ -1,27 +1,52 @@
 from django.views.decorators.cache import cache_page
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import (Http404, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Q, Value
 
+from . import counters, exporter, feed, fulltext, viewer
+from .conditional import conditional
 from .forms import PostForm, CommentForm, GroupForm
-from .models import Group, Post, User, Comment, Follow, Like, LikeComment
+from .models import (AuthorStats, Group, Post, User, Comment, Follow, Like,
+                     LikeComment)
+from .paginators import CursorPaginator, paginate
+
+
+def liked_by(user, model, target):
+    """Выражение «отмечено пользователем» для аннотации."""
+    if not user.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(model.objects.filter(user=user, **{target: OuterRef('pk')}))
+
+
+def following_count(user):
+    if not user.is_authenticated:
+        return 0
+    return AuthorStats.objects.filter(pk=user.pk).values_list(
+        'following', flat=True
+    ).first() or 0
+
+
+def counter_value(model, pk, field):
+    return model.objects.filter(pk=pk).values_list(
+        field, flat=True
+    ).first() or 0
 
 
 # @cache_page(10)
+@conditional()
 def index(request):
     template = 'posts/index.html'
     title = 'Последние обновления на сайте'
     post_list = Post.objects.select_related('author', 'group').all()
-    if request.user.is_authenticated:
-        follow_count = Follow.objects.select_related('author').filter(
-            user=request.user
-        ).count()
-    else:
-        follow_count = 0
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    follow_count = following_count(request.user)
+    page_obj = paginate(request, post_list)
+    viewer.attach(request.user, page_obj)
     context = {
         'title': title,
         'page_obj': page_obj,
@@ -31,13 +56,13 @@ def index(request):
     return render(request, template, context)
 
 
+@conditional(group__slug='slug')
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.select_related('author', 'group')
+    page_obj = paginate(request, post_list)
+    viewer.attach(request.user, page_obj)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -45,14 +70,16 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional(author__username='username')
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     post_list = author.posts.select_related('group').all()
-    posts_count = post_list.count()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts_count = counters.stat(author, 'posts')
+    page_obj = paginate(request, post_list)
+    viewer.attach(request.user, page_obj)
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             author=author,
@@ -64,38 +91,68 @@ def profile(request, username):
         'author': author,
         'page_obj': page_obj,
         'posts_count': posts_count,
+        'followers_count': counters.stat(author, 'followers'),
+        'following_count': counters.stat(author, 'following'),
         'following': following
     }
     return render(request, template, context)
 
 
+@conditional(pk='post_id')
 def post_view(request, post_id):
     template = 'posts/post_detail.html'
-    post = Post.objects.select_related('author', 'group').get(pk=post_id)
-    posts_count = post.author.posts.all().count()
-    like_count = Like.objects.filter(post=post_id).count()
-    if request.user.is_authenticated:
-        is_liked = Like.objects.filter(
-            user=request.user,
-            post=post_id
-        ).exists()
-    else:
-        is_liked = False
+    post_list = Post.objects.select_related(
+        'author__stats', 'group'
+    ).annotate(
+        is_liked=liked_by(request.user, Like, 'post'),
+    )
+    post = get_object_or_404(post_list, pk=post_id)
+    comments = comments_page(request, post, request.GET)
     form = CommentForm()
-    comments = Comment.objects.filter(post=post_id)
-    comment_count = Comment.objects.filter(post=post_id).count()
     context = {
         'post': post,
-        'posts_count': posts_count,
-        'like_count': like_count,
-        'comment_count': comment_count,
-        'is_liked': is_liked,
+        'posts_count': counters.stat(post.author, 'posts'),
+        'like_count': post.likes_count,
+        'comment_count': post.comments_count,
+        'is_liked': post.is_liked,
         'form': form,
         'comments': comments
     }
     return render(request, template, context)
 
 
+def comments_page(request, post, params):
+    """
+    Страница комментариев поста по курсору (created, id);
+    отметки пользователя загружаются одним запросом на страницу.
+    """
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        ordering=('-created', '-id'),
+    )
+    page_obj = paginator.get_page(params)
+    liked = set()
+    if request.user.is_authenticated and page_obj:
+        liked = set(LikeComment.objects.filter(
+            user=request.user,
+            comment__in=[comment.pk for comment in page_obj],
+        ).values_list('comment_id', flat=True))
+    for comment in page_obj:
+        comment.is_liked = comment.pk in liked
+    return page_obj
+
+
+def post_comments(request, post_id):
+    template = 'posts/includes/comment_list.html'
+    post = get_object_or_404(Post.objects.only('pk', 'author'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(request, post, request.GET),
+    }
+    return render(request, template, context)
+
+
 @login_required()
 def post_create(request):
     template = 'posts/create_post.html'
@@ -106,7 +163,8 @@ def post_create(request):
     if request.method == 'POST' and form.is_valid():
         form_post = form.save(commit=False)
         form_post.author = request.user
-        form_post.save()
+        with transaction.atomic():
+            form_post.save()
         return redirect('posts:profile', username=request.user)
     context = {
         'form': form,
@@ -127,8 +185,7 @@ def post_edit(request, post_id):
         )
         if request.method == 'POST' and form.is_valid():
             form_post = form.save(commit=False)
-            form_post.author = request.user
-            form_post.save()
+            form_post.save(update_fields=PostForm.Meta.fields)
             return redirect('posts:post_detail', post_id=post_id)
         context = {
             'form': form,
@@ -148,65 +205,60 @@ def post_delete(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = Post.objects.get(pk=post_id)
+    post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
-    if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
-        post.comments_count += 1
-        post.save()
+    if not form.is_valid():
+        if request.is_ajax():
+            return JsonResponse(
+                {'errors': form.errors.get_json_data()}, status=400
+            )
+        return redirect('posts:post_detail', post_id=post_id)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    counters.add_comment(comment)
+    if request.is_ajax():
+        html = render_to_string(
+            'posts/includes/comment_list.html',
+            {'post': post, 'comments': [comment]},
+            request=request,
+        )
+        return JsonResponse({
+            'html': html,
+            'comments_count': counter_value(Post, post_id, 'comments_count'),
+        })
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def delete_comment(request, post_id, com_id):
-    post = get_object_or_404(Post, id=post_id)
-    comment = get_object_or_404(Comment, id=com_id)
-    if comment.author == request.user or post.author == request.user:
-        comment.delete()
-        post.comments_count -= 1
-        post.save()
+    comment = get_object_or_404(
+        Comment.objects.select_related('post'), id=com_id, post=post_id
+    )
+    if request.user.pk in (comment.author_id, comment.post.author_id):
+        counters.delete_comment(comment)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def like_comment(request, post_id, com_id):
-    comment = Comment.objects.select_related('author', 'post').get(id=com_id)
-    like = LikeComment.objects.filter(
-        user=request.user,
-        comment=com_id
-    ).exists()
-    if not like:
-        LikeComment.objects.create(
-            user=request.user,
-            comment=comment
-        )
-        comment.like += 1
-        comment.save()
-    else:
-        LikeComment.objects.filter(
-            user__username=request.user,
-            comment=com_id
-        ).delete()
-        comment.like -= 1
-        comment.save()
+    get_object_or_404(Comment, id=com_id, post=post_id)
+    liked = counters.toggle_comment_like(request.user, com_id, post_id)
+    if request.is_ajax():
+        return JsonResponse({
+            'liked': liked,
+            'likes_count': counter_value(Comment, com_id, 'like'),
+        })
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    post_list = Post.objects.select_related('author', 'group').filter(
-        author__following__user=request.user
-    )
-    follow_count = Follow.objects.select_related('author').filter(
-        user=request.user
-    ).count()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    follow_count = following_count(request.user)
+    paginator = feed.FeedPaginator(request.user, settings.POSTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET)
+    viewer.attach(request.user, page_obj)
     context = {
         'page_obj': page_obj,
         'follow_count': follow_count,
@@ -217,38 +269,38 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    follow = Follow.objects.filter(
-        user=request.user,
-        author=author).exists()
-    if request.user != author and not follow:
-        Follow.objects.create(
-            user=request.user,
-            author=author
-        )
-    return redirect('posts:profile', username=username)
+    feed.follow(request.user.pk, author.pk)
+    return follow_response(request, author)
 
 
 @login_required
 def profile_unfollow(request, username):
-    Follow.objects.filter(
-        author__username=username,
-        user__username=request.user
-    ).delete()
-    return redirect('posts:profile', username=username)
+    author = get_object_or_404(User, username=username)
+    feed.unfollow(request.user.pk, author.pk)
+    return follow_response(request, author)
+
+
+def follow_response(request, author):
+    """JSON с новым состоянием для скрипта, редирект для ссылки."""
+    if not request.is_ajax():
+        return redirect('posts:profile', username=author.username)
+    return JsonResponse({
+        'following': Follow.objects.filter(
+            user=request.user, author=author
+        ).exists(),
+        'followers_count': counter_value(AuthorStats, author.pk, 'followers'),
+    })
 
 
 @login_required
 def like_index(request):
     template = 'posts/likes.html'
-    follow_count = Follow.objects.select_related('author').filter(
-        user=request.user
-    ).count()
+    follow_count = following_count(request.user)
     post_list = Post.objects.select_related('author', 'group').filter(
         liked__user=request.user
     )
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, post_list)
+    viewer.attach(request.user, page_obj)
     context = {
         'page_obj': page_obj,
         'follow_count': follow_count,
@@ -258,28 +310,35 @@ def like_index(request):
 
 @login_required
 def post_like(request, post_id):
-    post = Post.objects.select_related('author', 'group').get(pk=post_id)
-    like = Like.objects.filter(
-        user=request.user,
-        post=post_id
-    ).exists()
-    if not like:
-        Like.objects.create(
-            user=request.user,
-            post=post
-        )
-        post.likes_count += 1
-        post.save()
-    else:
-        Like.objects.filter(
-            user__username=request.user,
-            post=post_id
-        ).delete()
-        post.likes_count -= 1
-        post.save()
+    get_object_or_404(Post, pk=post_id)
+    liked = counters.toggle_post_like(request.user, post_id)
+    if request.is_ajax():
+        return JsonResponse({
+            'liked': liked,
+            'likes_count': counter_value(Post, post_id, 'likes_count'),
+        })
     return redirect(request.META.get('HTTP_REFERER'))
 
 
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query and fulltext.available():
+        paginator = fulltext.SearchPaginator(query, settings.POSTS_PER_PAGE)
+        page_obj = paginator.get_page(request.GET)
+    elif query:
+        post_list = Post.objects.select_related('author', 'group').filter(
+            Q(text__icontains=query) | Q(comments__text__icontains=query)
+        ).distinct()
+        page_obj = paginate(request, post_list)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
 @login_required
 def group_create(request):
     template = 'posts/create_group.html'
@@ -291,3 +350,28 @@ def group_create(request):
         'form': form
     }
     return render(request, template, context)
+
+
+@staff_member_required
+def export(request, kind):
+    """
+    Потоковая выгрузка таблицы в gzip NDJSON; параметры after (id)
+    и since (дата) задают начало инкрементальной выгрузки.
+    """
+    if kind not in exporter.EXPORTS:
+        raise Http404
+    try:
+        after_id = int(request.GET.get('after', 0))
+        since = request.GET.get('since')
+        since = exporter.parse_since(since) if since else None
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    records = exporter.rows(kind, after_id, since)
+    response = StreamingHttpResponse(
+        exporter.gzip_stream(exporter.ndjson(records)),
+        content_type='application/gzip',
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}.ndjson.gz"'
+    )
+    return response
@@ -0,0 +1,84 @@
+// Лайки, подписки и комментарии без перезагрузки страницы.
+// Сервер отвечает JSON на запросы с X-Requested-With; если ответ
+// не JSON (например, редирект на вход), выполняется обычный переход.
+// При ошибке сети или сервера состояние страницы не меняется: действие
+// могло уже выполниться, и повторный переход отменил бы его.
+(function () {
+  var ERROR = 'Не удалось выполнить действие. Обновите страницу.';
+
+  function NotJSON() {}
+
+  function send(url, options) {
+    options = options || {};
+    options.credentials = 'same-origin';
+    options.headers = {'X-Requested-With': 'XMLHttpRequest'};
+    return fetch(url, options).then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      var type = response.headers.get('Content-Type') || '';
+      if (type.indexOf('application/json') !== 0) {
+        throw new NotJSON();
+      }
+      return response.json();
+    });
+  }
+
+  function fail(fallback) {
+    return function (error) {
+      if (error instanceof NotJSON) {
+        fallback();
+      } else {
+        window.alert(ERROR);
+      }
+    };
+  }
+
+  var handlers = {
+    like: function (link, data) {
+      var scope = link.dataset.scope ? link.closest(link.dataset.scope) : link;
+      scope.querySelector('[data-role="icon"]').src = data.liked
+        ? link.dataset.likedSrc : link.dataset.unlikedSrc;
+      scope.querySelector('[data-role="count"]').textContent = data.likes_count;
+    },
+    follow: function (link, data) {
+      link.href = data.following
+        ? link.dataset.unfollowUrl : link.dataset.followUrl;
+      link.textContent = data.following ? 'Отписаться' : 'Подписаться';
+      var count = document.querySelector('[data-role="followers-count"]');
+      if (count) {
+        count.textContent = data.followers_count;
+      }
+    }
+  };
+
+  document.addEventListener('click', function (event) {
+    var link = event.target.closest('a[data-action]');
+    if (!link || !handlers[link.dataset.action]) {
+      return;
+    }
+    event.preventDefault();
+    send(link.href)
+      .then(function (data) { handlers[link.dataset.action](link, data); })
+      .catch(fail(function () { window.location = link.href; }));
+  });
+
+  document.addEventListener('submit', function (event) {
+    var form = event.target;
+    if (form.dataset.action !== 'comment') {
+      return;
+    }
+    event.preventDefault();
+    send(form.action, {method: 'POST', body: new FormData(form)})
+      .then(function (data) {
+        document.querySelector('.comments')
+          .insertAdjacentHTML('afterbegin', data.html);
+        var count = document.querySelector('[data-role="comments-count"]');
+        if (count) {
+          count.textContent = data.comments_count;
+        }
+        form.reset();
+      })
+      .catch(fail(function () { form.submit(); }));
+  });
+})();
@@ -0,0 +1,30 @@
+// Подгружает следующие комментарии, когда блок «Показать ещё»
+// появляется на экране.
+(function () {
+  function load(more) {
+    fetch(more.dataset.url, {credentials: 'same-origin'})
+      .then(function (response) { return response.text(); })
+      .then(function (html) {
+        var page = document.createElement('template');
+        page.innerHTML = html;
+        var next = page.content.querySelector('.comments-more');
+        more.replaceWith(page.content);
+        if (next) {
+          observer.observe(next);
+        }
+      });
+  }
+
+  var observer = new IntersectionObserver(function (entries) {
+    entries.forEach(function (entry) {
+      if (entry.isIntersecting) {
+        observer.unobserve(entry.target);
+        load(entry.target);
+      }
+    });
+  });
+
+  document.querySelectorAll('.comments-more').forEach(function (more) {
+    observer.observe(more);
+  });
+})();
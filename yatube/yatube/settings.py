@@ -47,12 +47,16 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
     'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.querytrace.QueryTraceMiddleware',
+    'core.slowlog.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -72,7 +76,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.TimedTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -99,9 +103,21 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# Применяются к каждому новому соединению (core.db.configure_sqlite).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+DB_HEALTH_CHECKS = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -154,12 +170,64 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Тесты переносят файлы кэша во временный каталог (core.runner).
+TEST_RUNNER = 'core.runner.TestRunner'
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+PAGINATOR_COUNT_TIMEOUT = 60
+
+FEED_MAX_ENTRIES = 1000
+FEED_FANOUT_LIMIT = 1000
+# Лента подрезается лениво, когда превышает лимит на столько записей.
+FEED_TRIM_SLACK = 100
+
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+POST_CARD_CACHE_STATS = False
+
+POST_IMAGE_WIDTHS = (320, 640, 960, 1500)
+POST_IMAGE_QUALITY = 80
+POST_IMAGE_WORKERS = 2
+
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 1
+
+QUERY_TRACE = False
+QUERY_TRACE_RAISE = False
+QUERY_TRACE_REPEAT = 3
+QUERY_BUDGETS = {
+    'posts:index': 7,
+    'posts:group_list': 7,
+    'posts:profile': 8,
+    'posts:post_detail': 6,
+    'posts:post_comments': 5,
+    'posts:follow_index': 8,
+    'posts:like_index': 6,
+    'posts:search': 4,
+    'api:posts': 5,
+    'api:post_detail': 5,
+    'api:post_comments': 5,
+    'api:follow_feed': 7,
+    'api:profile': 4,
+}
+
+SLOW_QUERY_MS = 100
+SLOW_QUERY_EXPLAIN_MS = 500
+SLOW_QUERY_REDACT = True
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'logs', 'slow_queries.log')
+SLOW_QUERY_LOG_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5